@@ -0,0 +1,114 @@
+import csv
+from datetime import datetime
+
+from rngs import plant_seeds
+from WebAppDES import B, K, BATCH_MEANS_FIELDNAMES, get_batch_means, simulate
+from WebAppMVA import get_saturation_rate
+
+MIN_RATE = 0.1  # lower bracket of the search
+TOLERANCE = 0.005  # width of the bracket at which the bisection stops
+MAX_K = 4 * K  # batches allowed at a point whose ci still covers the target
+# the search needs a metric that grows with the arrival rate: the response times and populations
+METRICS = ['avg_service_a', 'avg_service_b', 'avg_service_p', 'avg_population_a', 'avg_population_b',
+           'avg_population_p', 'avg_response_time', 'avg_population']
+
+
+def get_crossing(points, target):
+    # arrival rate where a piecewise linear curve through the (arrival_rate, value) points crosses the target,
+    # taken at the first point above it, None when even the lowest point is above it (below the search range)
+    points = sorted(points)
+    for i, (rate, value) in enumerate(points):
+        if value > target:
+            if i == 0:
+                return None
+            previous_rate, previous_value = points[i - 1]
+            return previous_rate + (rate - previous_rate) * (target - previous_value) / (value - previous_value)
+    return points[-1][0]
+
+
+def format_capacity(rate):
+    return "below the search range" if rate is None else f"{rate:.4f}"
+
+
+def capacity_search(target, auth=1, b_improvement=False, metric='avg_response_time', seed=123456789,
+                    low=MIN_RATE, tolerance=TOLERANCE, b=B, k=K, max_k=MAX_K):
+    # highest arrival rate whose metric stays below target, by bisection between low and the saturation rate of
+    # the analytic model. A point decides a side only when its ci is entirely above or below the target;
+    # otherwise the run of the point goes on until its batches have doubled, up to max_k, and the search stops
+    # if it is still undecided there. Returns the crossing of the mean curve and the crossings of its upper and
+    # lower ci bands
+    if metric not in METRICS:
+        raise ValueError(f"the capacity search takes a response time or population metric, not {metric}")
+    column = BATCH_MEANS_FIELDNAMES.index(metric)
+    high = get_saturation_rate(auth, b_improvement)  # the metric diverges there
+    points = []  # (arrival_rate, mean, ci) of every simulated point
+    runs = 0
+
+    while high - low > tolerance:
+        arrival_rate = round((low + high) / 2, 6)
+        plant_seeds(seed)
+        observations = simulate(arrival_rate, auth, b, 0, b_improvement)
+        runs += 1
+        means = [next(observations) for _ in range(k)]
+        while True:
+            data = get_batch_means(means)
+            mean, ci = data[column], data[column + 1]
+            print(f"Capacity: arrival_rate {arrival_rate}, {metric} {mean:.4f} +/- {ci:.4f} "
+                  f"with {len(means)} batches")
+            if mean + ci < target or mean - ci > target or 2 * len(means) > max_k:
+                break
+            means += [next(observations) for _ in range(len(means))]
+        observations.close()
+        points.append((arrival_rate, mean, ci))
+
+        if mean + ci < target:
+            low = arrival_rate
+        elif mean - ci > target:
+            high = arrival_rate
+        else:
+            break  # the target lies within the noise of the metric at this rate
+
+    if not points:
+        return low, low, low, runs
+    capacity = get_crossing([(rate, mean) for rate, mean, _ in points] + [(high, float('inf'))], target)
+    capacity_low = get_crossing([(rate, mean + ci) for rate, mean, ci in points] + [(high, float('inf'))], target)
+    capacity_high = get_crossing([(rate, mean - ci) for rate, mean, ci in points] + [(high, float('inf'))], target)
+    return capacity, capacity_low, capacity_high, runs
+
+
+def obj_capacity_search():
+    start = datetime.now()
+    print("Start Capacity Search")
+    with open('data_capacity_search.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'b_improvement', 'metric', 'target', 'saturation_rate',
+                      'capacity', 'capacity_low', 'capacity_high', 'runs']
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        configurations = [(1, False), (2, False), (1, True)]
+        targets = [5.0, 10.0, 20.0]
+        for auth, b_improvement in configurations:
+            for target in targets:
+                print(f"Capacity: auth type {auth}, improvement {b_improvement}, avg_response_time below {target}")
+                capacity, capacity_low, capacity_high, runs = capacity_search(target, auth, b_improvement)
+                print(f"Capacity: {format_capacity(capacity)} in [{format_capacity(capacity_low)}, "
+                      f"{format_capacity(capacity_high)}] after {runs} runs")
+                writer.writerow([auth, b_improvement, 'avg_response_time', target,
+                                 get_saturation_rate(auth, b_improvement), capacity, capacity_low, capacity_high,
+                                 runs])
+
+    end = datetime.now()
+    print(f"Capacity Search time: {end - start}\n")
+
+
+def main():
+    start = datetime.now()
+
+    obj_capacity_search()
+
+    end = datetime.now()
+    print(f"Total Simulation time: {end - start}\n")
+
+
+if __name__ == "__main__":
+    main()
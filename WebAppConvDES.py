@@ -2,8 +2,11 @@ import csv
 from datetime import datetime
 from enum import Enum
 
+import numpy as np
+
 from rngs import select_stream, plant_seeds, get_seed
 from rvgs import exponential
+from rvms import idfStudent
 
 ALPHA = 0.05
 START = 0.0  # initial time
@@ -11,6 +14,7 @@ STOP = 86400.0  # terminal time
 INFINITY = (100.0 * STOP)  # must be much larger than STOP
 arrivalTemp = START
 CAMP_INTERVAL = 300
+WINDOW = 12  # sampling intervals covered by the sliding window
 
 
 def get_arrival(arrival_rate):
@@ -66,12 +70,72 @@ class Track:
     def __init__(self):
         self.node = 0.0  # time integrated number in the node
         self.service = 0.0  # time integrated number in service
+        self.last = START  # time of the last integration
 
     def update(self, current_time, next_time, number):
         self.node += (next_time - current_time) * number
         self.service += (next_time - current_time)
 
 
+class WindowStats:
+    def __init__(self, window):
+        self.samples = [(START, 0.0, 0.0, 0, 0.0)] * (window + 1)  # ring buffer of cumulative snapshots
+        self.head = 0  # position of the most recent snapshot
+
+    def update(self, server, current_time):
+        server.update_area(current_time)
+        size = len(self.samples)
+        last = self.samples[self.head]
+        self.head = (self.head + 1) % size
+        oldest = self.samples[(self.head + 1) % size]
+        sample = (current_time, server.area.node, server.area.service, server.index,
+                  server.avg_service * server.index)
+        self.samples[self.head] = sample
+        return get_window_metrics(last, sample) + get_window_metrics(oldest, sample)
+
+
+def get_window_metrics(first, last):
+    interval = last[0] - first[0]
+    completions = last[3] - first[3]
+    avg_service = (last[4] - first[4]) / completions if completions > 0 else 0.0
+    avg_population = (last[1] - first[1]) / interval
+    utilization = (last[2] - first[2]) / interval
+    throughput = completions / interval
+    return [avg_service, avg_population, utilization, throughput]
+
+
+class EnsembleStats:
+    def __init__(self, size):
+        self.size = size  # number of metrics sampled at each camp
+        self.count = []  # replications folded in each time bucket
+        self.mean = []
+        self.variance = []  # sum of squared deviations from the mean
+
+    def update(self, bucket, values):
+        while len(self.count) <= bucket:
+            self.count.append(0)
+            self.mean.append([0.0] * self.size)
+            self.variance.append([0.0] * self.size)
+
+        self.count[bucket] += 1
+        n = self.count[bucket]
+        mean = self.mean[bucket]
+        variance = self.variance[bucket]
+        for i in range(self.size):
+            d = values[i] - mean[i]
+            variance[i] += d * d * (n - 1) / n
+            mean[i] += d / n
+
+    def get_statistics(self, bucket):
+        n = self.count[bucket]
+        data = []
+        for i in range(self.size):
+            variance = self.variance[bucket][i] / (n - 1) if n > 1 else 0.0
+            ci = idfStudent(n - 1, 1 - ALPHA / 2) * np.sqrt(variance / n) if n > 1 else 0.0
+            data += [self.mean[bucket][i], variance, ci]
+        return data
+
+
 class JobType(Enum):
     A1 = 1
     A2 = 2
@@ -112,10 +176,16 @@ class Server:
     def get_next_complete_process_time(self):
         return self.get_min_remaining_process_time() * self.number
 
+    def update_area(self, current_time):
+        if self.number > 0:
+            self.area.update(self.area.last, current_time, self.number)
+        self.area.last = current_time
+
     def reset_stats(self, current_time):
         self.index = 0
         self.area.node = 0
         self.area.service = 0
+        self.area.last = current_time
         self.last_event = current_time
 
         self.avg_interarrival = 0
@@ -127,6 +197,7 @@ class Server:
         self.service_variance = 0
 
     def process_arrival(self, new_job):
+        self.update_area(new_job.arrival)
         if self.number > 0:
             processed_time = (new_job.arrival - self.last_event) / self.number
             for job in self.jobs:
@@ -144,6 +215,7 @@ class Server:
         self.number += 1
 
     def process_completion(self, completion_time):
+        self.update_area(completion_time)
         if self.number > 0:
             processed_time = (completion_time - self.last_event) / self.number
             for job in self.jobs:
@@ -163,7 +235,8 @@ class Server:
         return completed_job
 
 
-def model(arrival_rate, writer, auth, b_improvement=False, ):
+def model(arrival_rate, writer, auth, b_improvement=False, ensemble=None, window_writer=None,
+          camp_interval=CAMP_INTERVAL, window=WINDOW):
     global arrivalTemp
     arrivalTemp = START
 
@@ -175,20 +248,13 @@ def model(arrival_rate, writer, auth, b_improvement=False, ):
 
     t.current = START  # set the clock
     t.arrival_a1 = get_arrival(arrival_rate)  # schedule the first arrival_a
-    t.camp = CAMP_INTERVAL
+    t.camp = camp_interval
+    windows = [WindowStats(window), WindowStats(window), WindowStats(window)]
 
     while t.arrival_a1 < STOP or server_a.number > 0 or server_b.number > 0 or server_p.number > 0:
 
         t.next = min(t.arrival_a1, t.completion_a, t.completion_b, t.completion_p, t.camp)  # next event time
 
-        # update integrals
-        if server_a.number > 0:
-            server_a.area.update(t.current, t.next, server_a.number)
-        if server_b.number > 0:
-            server_b.area.update(t.current, t.next, server_b.number)
-        if server_p.number > 0:
-            server_p.area.update(t.current, t.next, server_p.number)
-
         t.current = t.next  # advance the clock
 
         # arrival_a1
@@ -241,12 +307,24 @@ def model(arrival_rate, writer, auth, b_improvement=False, ):
                 t.completion_p = INFINITY
 
         elif t.current == t.camp:
-            writer.writerow((t.current, server_a.avg_service, server_b.avg_service, server_p.avg_service,
-                             3 * server_a.avg_service + server_b.avg_service + server_p.avg_service))
-            t.camp += CAMP_INTERVAL
+            sample = (server_a.avg_service, server_b.avg_service, server_p.avg_service,
+                      3 * server_a.avg_service + server_b.avg_service + server_p.avg_service)
+            if writer is not None:
+                writer.writerow((t.current,) + sample)
+            if ensemble is not None:
+                ensemble.update(int(t.camp / camp_interval) - 1, sample)
+            if window_writer is not None:
+                row = [t.current]
+                for server, window_stats in zip((server_a, server_b, server_p), windows):
+                    row += window_stats.update(server, t.current)
+                window_writer.writerow(row)
+            t.camp += camp_interval
 
 
 def get_simulation_statistics(server_a, server_b, server_p, current_time):
+    server_a.update_area(current_time)
+    server_b.update_area(current_time)
+    server_p.update_area(current_time)
     avg_population_a = server_a.area.node / current_time
     utilization_a = server_a.area.service / current_time
     avg_population_b = server_b.area.node / current_time
@@ -289,10 +367,75 @@ def obj_1_2_finite_horizon_simulation():
     print(f"Finite Horizon Simulation time: {end - start}\n")
 
 
+def obj_1_2_window_simulation():
+    start = datetime.now()
+    seed = 123456789
+    auth_types = [1, 2]
+    arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+    fieldnames = ['time']
+    for node in ['a', 'b', 'p']:
+        for window in ['tumbling', 'sliding']:
+            fieldnames += [f'avg_service_{node}_{window}', f'avg_population_{node}_{window}',
+                           f'utilization_{node}_{window}', f'throughput_{node}_{window}']
+    print("Start Finite Horizon Window Simulation")
+    for auth in auth_types:
+        for b_improvement in [True, False]:
+            for arrival_rate in arrival_rates:
+                with open(f'conv/data_{seed}_{arrival_rate}_{auth}_{b_improvement}_window.csv', 'w',
+                          newline='') as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(fieldnames)
+                    plant_seeds(seed)
+                    print(
+                        f"Finite Horizon Window: seed {seed}, arrival_rate {arrival_rate},  auth type {auth}, b improvement {b_improvement}")
+                    model(arrival_rate, None, auth, b_improvement, window_writer=writer)
+
+    end = datetime.now()
+
+    print(f"Finite Horizon Window Simulation time: {end - start}\n")
+
+
+def obj_1_2_ensemble_simulation():
+    start = datetime.now()
+    seed = 123456789
+    auth_types = [1, 2]
+    arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+    metrics = ['avg_service_a', 'avg_service_b', 'avg_service_p', 'avg_service']
+    ensembles = {}
+    print("Start Finite Horizon Ensemble Simulation")
+    for _ in range(0, 8):
+        for auth in auth_types:
+            for b_improvement in [True, False]:
+                for arrival_rate in arrival_rates:
+                    ensemble = ensembles.setdefault((arrival_rate, auth, b_improvement), EnsembleStats(len(metrics)))
+                    plant_seeds(seed)
+                    print(
+                        f"Finite Horizon Ensemble: seed {seed}, arrival_rate {arrival_rate},  auth type {auth}, b improvement {b_improvement}")
+                    model(arrival_rate, None, auth, b_improvement, ensemble)
+        seed = get_seed()
+
+    fieldnames = ['time', 'replications']
+    for metric in metrics:
+        fieldnames += [metric, f'{metric}_variance', f'{metric}_ci']
+    for (arrival_rate, auth, b_improvement), ensemble in ensembles.items():
+        with open(f'conv/data_ensemble_{arrival_rate}_{auth}_{b_improvement}_conv.csv', 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(fieldnames)
+            for bucket in range(len(ensemble.count)):
+                writer.writerow([(bucket + 1) * CAMP_INTERVAL, ensemble.count[bucket]] +
+                                ensemble.get_statistics(bucket))
+
+    end = datetime.now()
+
+    print(f"Finite Horizon Ensemble Simulation time: {end - start}\n")
+
+
 def main():
     start = datetime.now()
 
     obj_1_2_finite_horizon_simulation()
+    obj_1_2_ensemble_simulation()
+    # obj_1_2_window_simulation()
 
     end = datetime.now()
     print(f"Total Simulation time: {end - start}\n")
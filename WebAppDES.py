@@ -1,11 +1,14 @@
 import csv
+from bisect import bisect_right
+from collections import deque
 from datetime import datetime
 from enum import Enum
+from heapq import heappush, heappop
 
 import numpy as np
 
-from rngs import select_stream, plant_seeds
-from rvgs import exponential
+from rngs import select_stream, plant_seeds, random
+from rvgs import exponential, lognormal, uniform
 from rvms import idfStudent
 
 ALPHA = 0.05
@@ -14,6 +17,69 @@ STOP = 5760000.0  # terminal time
 INFINITY = (100.0 * STOP)  # must be much larger than STOP
 B = 8192
 K = 64
+BUDGET = 15  # model runs of an adaptive sweep, as many as the fixed grid
+CORES = (1, 1, 1)  # processors of the A, B and P hosts
+LIMITS = (0, 0, 0)  # jobs in service at most on A, B and P, 0 for no limit
+
+BATCH_MEANS_FIELDNAMES = ['interarrival_a', 'interarrival_a_ci',
+                          'avg_service_a', 'avg_service_a_ci',
+                          'avg_population_a', 'avg_population_a_ci',
+                          'utilization_a', 'utilization_a_ci',
+                          'completion_a', 'completion_a_ci',
+                          'interarrival_b', 'interarrival_b_ci',
+                          'avg_service_b', 'avg_service_b_ci',
+                          'avg_population_b', 'avg_population_b_ci',
+                          'utilization_b', 'utilization_b_ci',
+                          'completion_b', 'completion_b_ci',
+                          'interarrival_p', 'interarrival_p_ci',
+                          'avg_service_p', 'avg_service_p_ci',
+                          'avg_population_p', 'avg_population_p_ci',
+                          'utilization_p', 'utilization_p_ci',
+                          'completion_p', 'completion_p_ci',
+                          'avg_response_time', 'avg_response_time_ci',
+                          'avg_population', 'avg_population_ci']
+RESPONSE_TIME = BATCH_MEANS_FIELDNAMES.index('avg_response_time')
+
+# appended to the observations when a node has a limit
+LIMITED_FIELDNAMES = BATCH_MEANS_FIELDNAMES + ['avg_wait_a', 'avg_wait_a_ci',
+                                               'avg_in_service_a', 'avg_in_service_a_ci',
+                                               'avg_wait_b', 'avg_wait_b_ci',
+                                               'avg_in_service_b', 'avg_in_service_b_ci',
+                                               'avg_wait_p', 'avg_wait_p_ci',
+                                               'avg_in_service_p', 'avg_in_service_p_ci']
+
+# appended to the observations, after the wait columns if any, when arrivals go through an admission control;
+# rejection_ratio is over every attempt that reached it, retries included
+ADMISSION_COLUMNS = ['goodput', 'goodput_ci', 'rejection_ratio', 'rejection_ratio_ci']
+ADMISSION_FIELDNAMES = BATCH_MEANS_FIELDNAMES + ADMISSION_COLUMNS
+
+# appended last, when the requests have timeouts
+RETRY_COLUMNS = ['amplification_a', 'amplification_a_ci',
+                 'amplification_b', 'amplification_b_ci',
+                 'amplification_p', 'amplification_p_ci',
+                 'wasted_a', 'wasted_a_ci',
+                 'wasted_b', 'wasted_b_ci',
+                 'wasted_p', 'wasted_p_ci',
+                 'abandonment_ratio', 'abandonment_ratio_ci',
+                 'failure_ratio', 'failure_ratio_ci',
+                 'avg_request_time', 'avg_request_time_ci']
+RETRY_FIELDNAMES = BATCH_MEANS_FIELDNAMES + RETRY_COLUMNS
+
+# appended last, when the routing edges have delays; avg_response_time stays the time spent in the nodes
+DELAY_COLUMNS = ['avg_delay_a_b', 'avg_delay_a_b_ci',
+                 'avg_delay_b_a', 'avg_delay_b_a_ci',
+                 'avg_delay_a_p', 'avg_delay_a_p_ci',
+                 'avg_delay_p_a', 'avg_delay_p_a_ci',
+                 'avg_network_time', 'avg_network_time_ci',
+                 'avg_end_to_end_time', 'avg_end_to_end_time_ci']
+DELAY_FIELDNAMES = BATCH_MEANS_FIELDNAMES + DELAY_COLUMNS
+
+# appended last, with fork-join routing; the request response time is measured per request, from its arrival
+FORK_COLUMNS = ['fork_ratio', 'fork_ratio_ci',
+                'avg_fork_time', 'avg_fork_time_ci',
+                'avg_join_wait', 'avg_join_wait_ci',
+                'avg_request_response_time', 'avg_request_response_time_ci']
+FORK_FIELDNAMES = BATCH_MEANS_FIELDNAMES + FORK_COLUMNS
 
 arrivalTemp = START
 
@@ -26,33 +92,33 @@ def get_arrival(arrival_rate):
     return arrivalTemp
 
 
-def get_service(job_type, auth=1, b_improvement=False):
+def get_avg_demand(job_type, auth=1, b_improvement=False):
     avg_demand = -1
     if job_type == JobType.A1:
-        select_stream(1)
         avg_demand = 0.2
     elif job_type == JobType.A2:
-        select_stream(2)
         avg_demand = 0.4
     elif job_type == JobType.A3:
-        select_stream(3)
         if auth == 1:
             avg_demand = 0.1
         else:
             avg_demand = 0.15
     elif job_type == JobType.B:
-        select_stream(4)
         if b_improvement:
             avg_demand = 0.4
         else:
             avg_demand = 0.8
     elif job_type == JobType.P:
-        select_stream(5)
         if auth == 1:
             avg_demand = 0.4
         else:
             avg_demand = 0.7
-    return exponential(avg_demand)
+    return avg_demand
+
+
+def get_service(job_type, auth=1, b_improvement=False):
+    select_stream(job_type.value)  # streams 1-5 follow the job type values
+    return exponential(get_avg_demand(job_type, auth, b_improvement))
 
 
 class Time:
@@ -63,16 +129,28 @@ class Time:
     current = INFINITY  # current time
     next = INFINITY  # next (most imminent) event time
     last = INFINITY  # last arrival_a time
+    timer = INFINITY  # next timeout or retry
+    transfer = INFINITY  # next end of a delay
+
+    def set_completion(self, node, completion):
+        if node == 0:
+            self.completion_a = completion
+        elif node == 1:
+            self.completion_b = completion
+        else:
+            self.completion_p = completion
 
 
 class Track:
     def __init__(self):
         self.node = 0.0  # time integrated number in the node
         self.service = 0.0  # time integrated number in service
+        self.last = START  # time of the last integration
 
-    def update(self, current_time, next_time, number):
+    def update(self, current_time, next_time, number, cores=1, serving=None):
+        serving = number if serving is None else serving
         self.node += (next_time - current_time) * number
-        self.service += (next_time - current_time)
+        self.service += (next_time - current_time) * min(serving, cores) / cores  # busy fraction of the cores
 
 
 class JobType(Enum):
@@ -83,11 +161,298 @@ class JobType(Enum):
     P = 5
 
 
+class Discipline(Enum):
+    PS = 1  # processor sharing
+    FCFS = 2
+    SRPT = 3  # preemptive shortest remaining processing time
+    LCFS = 4  # preemptive resume last come first served
+    LAS = 5  # least attained service
+    DPS = 6  # discriminatory processor sharing, weighted by DPS_WEIGHTS
+
+
+DISCIPLINES = (Discipline.PS, Discipline.PS, Discipline.PS)  # of the A, B and P nodes
+ROUTING = {JobType.A1: JobType.B, JobType.A2: JobType.P, JobType.B: JobType.A2, JobType.P: JobType.A3}  # next visit
+FORK_ROUTING = {JobType.A1: (JobType.B, JobType.P), JobType.B: (JobType.A2,), JobType.P: (JobType.A2,),
+                JobType.A2: (JobType.A3,)}  # next visits of a forked request, joining at A2
+EDGES = [JobType.A1, JobType.B, JobType.A2, JobType.P]  # A to B, B to A, A to P and P to A, by their source
+NODES = {JobType.A1: 0, JobType.A2: 0, JobType.A3: 0, JobType.B: 1, JobType.P: 2}  # 0 for A, 1 for B, 2 for P
+TRANSIT = 3  # node of a request in a delay
+DPS_WEIGHTS = {JobType.A1: 1.0, JobType.A2: 1.0, JobType.A3: 2.0, JobType.B: 1.0, JobType.P: 1.0}  # A3 ends requests
+
+
+class AdmissionControl:
+    # gate of the A1 arrivals: a token bucket of rate tokens per unit time holding up to burst tokens, a cap on the
+    # requests in the network and quotas of jobs per type in the network (a request is one job at a time, of the
+    # type of its current visit). An arrival is admitted if it passes all the ones set; 0 or None leaves one out
+    def __init__(self, rate=0.0, burst=1.0, max_in_flight=0, quotas=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.quotas = quotas
+        self.reset(START)
+
+    def reset(self, current_time):
+        self.tokens = self.burst
+        self.last = current_time
+        self.in_flight = 0
+        self.jobs = {job_type: 0 for job_type in JobType}
+        self.attempts = 0  # since the start of the batch, retries included
+        self.rejected = 0
+
+    def admit(self, current_time):
+        self.attempts += 1
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (current_time - self.last) * self.rate)
+            self.last = current_time
+        if (self.rate > 0 and self.tokens < 1 or self.max_in_flight and self.in_flight >= self.max_in_flight or
+                self.quotas and any(self.jobs[job_type] >= quota for job_type, quota in self.quotas.items())):
+            self.rejected += 1
+            return False
+        if self.rate > 0:
+            self.tokens -= 1
+        self.in_flight += 1
+        self.jobs[JobType.A1] += 1
+        return True
+
+    def move(self, job_type, next_job_type=None):
+        # a request moves on to its next visit, or leaves the network
+        self.jobs[job_type] -= 1
+        if next_job_type is None:
+            self.in_flight -= 1
+        else:
+            self.jobs[next_job_type] += 1
+
+    def route(self, job_type=None, next_job_types=()):
+        # a request moves on from a visit to several at a fork, and to none for a sibling on its way to the join,
+        # which counts the request again at A2 once the last sibling is back
+        if job_type is not None:
+            self.jobs[job_type] -= 1
+        for next_job_type in next_job_types:
+            self.jobs[next_job_type] += 1
+
+
 class Job:
     def __init__(self, arrival, job_type, auth=1, b_improvement=False):
         self.arrival = arrival
         self.remaining = get_service(job_type, auth, b_improvement)
         self.job_type = job_type
+        self.demand = self.remaining
+        self.request = None  # with timeouts, the request the job is a visit of
+        self.start = arrival  # arrival of its request
+        self.fork = None  # with fork-join routing, the fork of its request
+        self.admission = None  # time it entered service, set by its node
+
+
+class RetryPolicy:
+    # a request abandons its attempt timeout after the attempt started, from whichever node it is in, and is tried
+    # again up to retries times, after a backoff growing by factor at each retry and shortened by up to jitter of
+    # itself at random (stream 7)
+    def __init__(self, timeout=30.0, retries=3, backoff=1.0, factor=2.0, jitter=0.5):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.factor = factor
+        self.jitter = jitter
+
+    def get_delay(self, attempt):
+        select_stream(7)
+        return self.backoff * self.factor ** (attempt - 1) * (1 - self.jitter * random())
+
+
+class Request:
+    def __init__(self, request_id, arrival):
+        self.id = request_id
+        self.arrival = arrival  # of the first attempt
+        self.attempt = 0
+        self.job = None  # job of the current visit, None while waiting to be retried
+        self.node = 0  # node of the current visit, or TRANSIT with the job it left in a delay
+        self.work = [0.0, 0.0, 0.0]  # received at A, B and P by the current attempt
+
+
+class Clients:
+    # the requests in the network or waiting to be retried. Timeouts and retries share a heap of
+    # (time, request, attempt); an entry is cancelled lazily, by its request leaving or moving to another attempt,
+    # and dropped when it reaches the top
+    def __init__(self, retry):
+        self.retry = retry
+        self.requests = {}
+        self.timers = []
+        self.count = 0  # requests so far, for their ids
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.attempts = 0
+        self.abandoned = 0  # attempts
+        self.failed = 0  # requests out of retries
+        self.succeeded = 0
+        self.request_time = 0.0  # of the succeeded requests, from their first attempt
+        self.wasted = [0.0, 0.0, 0.0]  # work received at A, B and P by abandoned attempts
+
+    def get_next_timer(self):
+        while self.timers:
+            _, request_id, attempt = self.timers[0]
+            if request_id in self.requests and self.requests[request_id].attempt == attempt:
+                return self.timers[0][0]
+            heappop(self.timers)
+        return INFINITY
+
+    def pop_timer(self):
+        return self.requests[heappop(self.timers)[1]]
+
+    def start(self, current_time):
+        self.count += 1
+        request = Request(self.count, current_time)
+        self.requests[request.id] = request
+        return request
+
+    def try_request(self, request, job, current_time):
+        # job is the A1 visit of the attempt, None when the admission control turned it away
+        self.attempts += 1
+        if job is None:
+            self.fail(request, current_time)
+        else:
+            request.job = job
+            request.node = 0
+            job.request = request
+            heappush(self.timers, (current_time + self.retry.timeout, request.id, request.attempt))
+
+    def fail(self, request, current_time):
+        for node in range(3):
+            self.wasted[node] += request.work[node]
+        request.work = [0.0, 0.0, 0.0]
+        request.job = None
+        if request.attempt < self.retry.retries:
+            request.attempt += 1
+            heappush(self.timers, (current_time + self.retry.get_delay(request.attempt), request.id,
+                                   request.attempt))
+        else:
+            self.failed += 1
+            del self.requests[request.id]
+
+    def hand_over(self, completed_job, node):
+        request = completed_job.request
+        request.work[node] += completed_job.demand
+        request.job = completed_job
+        request.node = TRANSIT
+
+    def receive(self, completed_job, next_job, next_node):
+        request = completed_job.request
+        request.job = next_job
+        request.node = next_node
+        next_job.request = request
+
+    def complete(self, completed_job, current_time):
+        request = completed_job.request
+        self.succeeded += 1
+        self.request_time += current_time - request.arrival
+        del self.requests[request.id]
+
+
+class Distribution(Enum):
+    CONSTANT = 1
+    EXPONENTIAL = 2
+    UNIFORM = 3  # between 0 and twice the mean
+    LOGNORMAL = 4  # with the given scv
+
+
+class DelayNode:
+    # infinite server on a routing edge: every request crossing it is held for a delay of the given mean,
+    # independently of the others
+    def __init__(self, mean, distribution=Distribution.EXPONENTIAL, scv=1.0):
+        self.mean = mean
+        self.distribution = distribution
+        self.scv = scv
+        self.reset_stats()
+
+    def get_delay(self, stream):
+        select_stream(stream)
+        if self.distribution == Distribution.CONSTANT:
+            return self.mean
+        if self.distribution == Distribution.EXPONENTIAL:
+            return exponential(self.mean)
+        if self.distribution == Distribution.UNIFORM:
+            return uniform(0.0, 2 * self.mean)
+        sigma = np.sqrt(np.log(1 + self.scv))
+        return lognormal(np.log(self.mean) - sigma * sigma / 2, sigma)
+
+    def reset_stats(self):
+        self.index = 0
+        self.avg_delay = 0.0
+
+
+class Transfers:
+    # the requests in the delays of every edge, in a single heap of (end, count, start, job, type of the next visit,
+    # edge) so that the next end costs one look at its top. The delay of an edge draws from stream 7 plus the job
+    # type value keying it
+    def __init__(self, delays):
+        self.delays = delays
+        self.heap = []
+        self.count = 0
+
+    def get_next_transfer(self):
+        return self.heap[0][0] if self.heap else INFINITY
+
+    def send(self, completed_job, job_type, edge, current_time):
+        delay = self.delays[edge].get_delay(7 + edge.value)
+        heappush(self.heap, (current_time + delay, self.count, current_time, completed_job, job_type, edge))
+        self.count += 1
+
+    def receive(self):
+        end, _, start, completed_job, job_type, edge = heappop(self.heap)
+        delay_node = self.delays[edge]
+        delay_node.index += 1
+        delay_node.avg_delay += (end - start - delay_node.avg_delay) / delay_node.index
+        return completed_job, job_type
+
+    def reset_stats(self):
+        for delay_node in self.delays.values():
+            delay_node.reset_stats()
+
+
+class ForkJoin:
+    # fork-join routing for a share of the requests, drawn from stream 13 as they leave A1: A calls B and P at once,
+    # and the request goes on to A2 and then A3 once both are back. A counter per fork, keyed by its id, holds the
+    # siblings still out, the time of the fork and the time the first of them came back
+    def __init__(self, share=1.0):
+        self.share = share
+        self.counters = {}
+        self.count = 0  # forks so far, for their ids
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.forks = 0
+        self.joins = 0
+        self.fork_time = 0.0  # from the fork to the join
+        self.join_wait = 0.0  # of the first sibling back
+        self.requests = 0
+        self.request_time = 0.0  # of every completed request, forked or not
+
+    def is_forked(self):
+        select_stream(13)
+        return random() < self.share
+
+    def fork(self, current_time):
+        self.count += 1
+        self.forks += 1
+        self.counters[self.count] = [2, current_time, current_time]
+        return self.count
+
+    def join(self, completed_job, current_time):
+        # a sibling is back, True for the last one
+        counter = self.counters[completed_job.fork]
+        counter[0] -= 1
+        if counter[0] > 0:
+            counter[2] = current_time
+            return False
+        del self.counters[completed_job.fork]
+        self.joins += 1
+        self.fork_time += current_time - counter[1]
+        self.join_wait += current_time - counter[2]
+        return True
+
+    def complete(self, completed_job, current_time):
+        self.requests += 1
+        self.request_time += current_time - completed_job.start
 
 
 class JobStats:
@@ -118,7 +483,7 @@ class JobStats:
         self.service_variance += d * d * (self.index - 1) / self.index
         self.avg_service += d / self.index
 
-    def reset_stats(self):
+    def reset_stats(self, current_time):
         self.index = 0
         self.avg_service = 0
         self.service_variance = 0
@@ -126,12 +491,17 @@ class JobStats:
         self.avg_interarrival = 0
         self.arrivals = 0
         self.interarrival_variance = 0
-        self.last_arrival = 0
+        self.last_arrival = current_time
 
 
 class Server:
-    def __init__(self):
-        self.jobs = []
+    # processor sharing over cores processors: each of the n jobs in service is served at rate min(1, cores / n).
+    # With a limit, at most limit jobs are in service and the others wait for a slot in a FIFO admission queue
+    def __init__(self, cores=1, limit=0):
+        self.cores = cores
+        self.limit = limit
+        self.jobs = []  # in service
+        self.queue = deque()
         self.jobs_stats = []
         self.number = 0  # number in the node
         self.index = 0  # used to count departed jobs
@@ -148,34 +518,73 @@ class Server:
         self.avg_service = 0
         self.service_variance = 0
 
+        # admission, split of avg_service
+        self.avg_wait = 0
+        self.avg_in_service = 0
+
     def get_min_remaining_process_time(self):
         min_job = min(self.jobs, key=lambda job: job.remaining)
         return min_job.remaining
 
+    def get_slowdown(self):
+        # time to serve a unit of work to every job in service
+        return max(len(self.jobs) / self.cores, 1)
+
+    def get_serving(self):
+        return len(self.jobs)
+
     def get_next_complete_process_time(self):
-        return self.get_min_remaining_process_time() * self.number
+        return self.get_min_remaining_process_time() * self.get_slowdown()
+
+    def update_area(self, current_time):
+        if self.number > 0:
+            self.area.update(self.area.last, current_time, self.number, self.cores, self.get_serving())
+        self.area.last = current_time
 
     def reset_stats(self, current_time):
         self.index = 0
         self.area.node = 0
         self.area.service = 0
-        self.last_event = current_time
+        self.area.last = current_time
 
         self.avg_interarrival = 0
         self.arrivals = 0
         self.interarrival_variance = 0
-        self.last_arrival = 0
+        self.last_arrival = current_time
 
         self.avg_service = 0
         self.service_variance = 0
 
-    def process_arrival(self, new_job):
+        self.avg_wait = 0
+        self.avg_in_service = 0
+
+    def serve(self, current_time):
+        # gives every job in service its share of the work done since the last event
         if self.number > 0:
-            processed_time = (new_job.arrival - self.last_event) / self.number
+            processed_time = (current_time - self.last_event) / self.get_slowdown()
             for job in self.jobs:
                 job.remaining -= processed_time
-                job.last_event = job.arrival
-        self.last_event = new_job.arrival
+        self.last_event = current_time
+
+    def admit(self, new_job):
+        if self.limit and len(self.jobs) == self.limit:
+            self.queue.append(new_job)
+        else:
+            new_job.admission = new_job.arrival
+            self.jobs.append(new_job)
+
+    def release(self, completion_time):
+        self.jobs.sort(key=lambda x: x.remaining)
+        completed_job = self.jobs.pop(0)
+        if self.queue:
+            admitted_job = self.queue.popleft()
+            admitted_job.admission = completion_time
+            self.jobs.append(admitted_job)
+        return completed_job
+
+    def process_arrival(self, new_job):
+        self.update_area(new_job.arrival)
+        self.serve(new_job.arrival)
 
         self.arrivals += 1
         d = new_job.arrival - self.last_arrival - self.avg_interarrival
@@ -183,72 +592,370 @@ class Server:
         self.interarrival_variance += d * d * (self.arrivals - 1) / self.arrivals
         self.avg_interarrival += d / self.arrivals
 
-        self.jobs.append(new_job)
+        self.admit(new_job)
         self.number += 1
 
     def process_completion(self, completion_time):
-        if self.number > 0:
-            processed_time = (completion_time - self.last_event) / self.number
-            for job in self.jobs:
-                job.remaining -= processed_time
-                job.last_event = completion_time
-        self.last_event = completion_time
+        self.update_area(completion_time)
+        self.serve(completion_time)
 
-        self.jobs.sort(key=lambda x: x.remaining)
-        completed_job = self.jobs.pop(0)
+        completed_job = self.release(completion_time)
         self.index += 1
         self.number -= 1
 
         d = completion_time - completed_job.arrival - self.avg_service
         self.service_variance += d * d * (self.index - 1) / self.index
         self.avg_service += d / self.index
+        self.avg_wait += (completed_job.admission - completed_job.arrival - self.avg_wait) / self.index
+        self.avg_in_service += (completion_time - completed_job.admission - self.avg_in_service) / self.index
+
+        return completed_job
+
+    def abandon(self, job, current_time):
+        # removes a job before its completion, returning the work it received
+        self.update_area(current_time)
+        self.serve(current_time)
+        if job in self.jobs:
+            self.jobs.remove(job)
+            if self.queue:
+                admitted_job = self.queue.popleft()
+                admitted_job.admission = current_time
+                self.jobs.append(admitted_job)
+        else:
+            self.queue.remove(job)
+        self.number -= 1
+        return job.demand - job.remaining
+
 
+# the other disciplines run on a single processor and without a limit; a job is admitted at its arrival,
+# except under FCFS where it is admitted when its service starts
+
+
+class FCFSServer(Server):
+    def __init__(self):
+        super().__init__()
+        self.jobs = deque()  # the first is in service
+
+    def get_next_complete_process_time(self):
+        return self.jobs[0].remaining
+
+    def get_serving(self):
+        return 1
+
+    def serve(self, current_time):
+        if self.number > 0:
+            self.jobs[0].remaining -= current_time - self.last_event
+        self.last_event = current_time
+
+    def admit(self, new_job):
+        if not self.jobs:
+            new_job.admission = new_job.arrival
+        self.jobs.append(new_job)
+
+    def release(self, completion_time):
+        completed_job = self.jobs.popleft()
+        if self.jobs:
+            self.jobs[0].admission = completion_time
         return completed_job
 
 
-def model(arrival_rate, auth, b=0, k=0, b_improvement=False):
+class LCFSServer(Server):
+    # preemptive resume: the last arrived job is served, the others keep their remaining work on a stack
+    def get_next_complete_process_time(self):
+        return self.jobs[-1].remaining
+
+    def get_serving(self):
+        return 1
+
+    def serve(self, current_time):
+        if self.number > 0:
+            self.jobs[-1].remaining -= current_time - self.last_event
+        self.last_event = current_time
+
+    def admit(self, new_job):
+        new_job.admission = new_job.arrival
+        self.jobs.append(new_job)
+
+    def release(self, completion_time):
+        return self.jobs.pop()
+
+
+class SRPTServer(Server):
+    # the job with the shortest remaining work is served, the others wait in a heap keyed by their remaining work,
+    # which does not change while they wait
+    def __init__(self):
+        super().__init__()
+        self.current = None  # job in service
+        self.count = 0  # ties in the heap go to the first arrived
+
+    def get_next_complete_process_time(self):
+        return self.current.remaining
+
+    def get_serving(self):
+        return 1
+
+    def serve(self, current_time):
+        if self.number > 0:
+            self.current.remaining -= current_time - self.last_event
+        self.last_event = current_time
+
+    def admit(self, new_job):
+        new_job.admission = new_job.arrival
+        if self.current is not None and self.current.remaining <= new_job.remaining:
+            heappush(self.jobs, (new_job.remaining, self.count, new_job))
+        else:
+            if self.current is not None:
+                heappush(self.jobs, (self.current.remaining, self.count, self.current))
+            self.current = new_job
+        self.count += 1
+
+    def release(self, completion_time):
+        completed_job = self.current
+        self.current = heappop(self.jobs)[2] if self.jobs else None
+        return completed_job
+
+
+class LASServer(Server):
+    # least attained service: the jobs with the least attained service share the processor. A new job has attained
+    # nothing, so the jobs form a stack of groups by attained service with the served group on top; it rises
+    # until it reaches the group below and merges with it. The served group reaches the demands in increasing
+    # order, so the next to complete is the smallest demand left, taken from a single heap, once the served group
+    # has risen to it through every group below it. Sums of the groups from the bottom of the stack give that
+    # time after one bisection, and the stack only changes at its top
+    def __init__(self):
+        super().__init__()
+        self.levels = []  # minus the attained service of each group, the served one last, so increasing
+        self.counts = []  # jobs of each group
+        self.sums = []  # jobs of the groups from the bottom up to each one
+        self.weights = []  # the same weighted by their attained service
+        self.count = 0
+
+    def get_next_complete_process_time(self):
+        demand = self.jobs[0][0]
+        i = bisect_right(self.levels, -demand)  # the groups from i up have attained less than demand
+        if i == len(self.levels):
+            return 0.0
+        jobs = self.sums[-1] - (self.sums[i - 1] if i > 0 else 0)
+        weight = self.weights[-1] - (self.weights[i - 1] if i > 0 else 0.0)
+        return demand * jobs - weight
+
+    def get_serving(self):
+        return 1
+
+    def update_top(self):
+        # the sums of the served group, after its attained service or its jobs changed
+        self.sums[-1] = (self.sums[-2] if len(self.sums) > 1 else 0) + self.counts[-1]
+        self.weights[-1] = (self.weights[-2] if len(self.weights) > 1 else 0.0) - self.counts[-1] * self.levels[-1]
+
+    def serve(self, current_time):
+        elapsed = current_time - self.last_event
+        while elapsed > 0 and self.counts:
+            if len(self.counts) > 1 and (self.levels[-1] - self.levels[-2]) * self.counts[-1] <= elapsed:
+                elapsed -= (self.levels[-1] - self.levels[-2]) * self.counts[-1]
+                self.merge()
+            else:
+                self.levels[-1] -= elapsed / self.counts[-1]
+                self.update_top()
+                elapsed = 0
+        self.last_event = current_time
+
+    def merge(self):
+        # the served group joins the one below
+        count = self.counts.pop()
+        self.levels.pop()
+        self.sums.pop()
+        self.weights.pop()
+        self.counts[-1] += count
+        self.update_top()
+
+    def admit(self, new_job):
+        new_job.admission = new_job.arrival
+        heappush(self.jobs, (new_job.remaining, self.count, new_job))
+        self.count += 1
+        if not self.counts or self.levels[-1] < 0:
+            self.levels.append(0.0)
+            self.counts.append(0)
+            self.sums.append(0)
+            self.weights.append(0.0)
+        self.counts[-1] += 1
+        self.update_top()
+
+    def release(self, completion_time):
+        completed_job = heappop(self.jobs)[2]
+        self.counts[-1] -= 1
+        if self.counts[-1] == 0:
+            self.counts.pop()
+            self.levels.pop()
+            self.sums.pop()
+            self.weights.pop()
+        else:
+            self.update_top()
+        return completed_job
+
+
+class DPSServer(Server):
+    # discriminatory processor sharing: a job of weight w gets w / W of the processor, W the total weight in the
+    # node. A virtual clock advancing at rate 1 / W finishes a job once it has advanced by its demand over its
+    # weight, so the jobs wait in a heap keyed by their virtual finishing time
+    def __init__(self, weights=None):
+        super().__init__()
+        self.weights = DPS_WEIGHTS if weights is None else weights
+        self.virtual = 0.0  # virtual clock
+        self.weight = 0.0  # total weight in the node
+        self.count = 0
+
+    def get_next_complete_process_time(self):
+        return (self.jobs[0][0] - self.virtual) * self.weight
+
+    def get_serving(self):
+        return 1
+
+    def serve(self, current_time):
+        if self.number > 0:
+            self.virtual += (current_time - self.last_event) / self.weight
+        self.last_event = current_time
+
+    def admit(self, new_job):
+        new_job.admission = new_job.arrival
+        weight = self.weights[new_job.job_type]
+        heappush(self.jobs, (self.virtual + new_job.remaining / weight, self.count, new_job))
+        self.weight += weight
+        self.count += 1
+
+    def release(self, completion_time):
+        completed_job = heappop(self.jobs)[2]
+        self.weight = self.weight - self.weights[completed_job.job_type] if self.jobs else 0.0
+        return completed_job
+
+
+def get_server(discipline=Discipline.PS, cores=1, limit=0):
+    if discipline == Discipline.PS:
+        return Server(cores, limit)
+    if cores != 1 or limit != 0:
+        raise ValueError("only processor sharing nodes take cores and limits")
+    if discipline == Discipline.FCFS:
+        return FCFSServer()
+    if discipline == Discipline.LCFS:
+        return LCFSServer()
+    if discipline == Discipline.SRPT:
+        return SRPTServer()
+    if discipline == Discipline.LAS:
+        return LASServer()
+    return DPSServer()
+
+
+def model(arrival_rate, auth, b=0, k=0, b_improvement=False, cores=CORES, limits=LIMITS, disciplines=DISCIPLINES,
+          admission=None, retry=None, delays=None, fork_join=None):
+    if b != 0 and k != 0:
+        return get_batch_means(list(simulate(arrival_rate, auth, b, k, b_improvement, cores, limits, disciplines,
+                                             admission, retry, delays, fork_join)))
+    return next(simulate(arrival_rate, auth, b_improvement=b_improvement, cores=cores, limits=limits,
+                         disciplines=disciplines, admission=admission, retry=retry, delays=delays,
+                         fork_join=fork_join))
+
+
+def admit_request(server_a, admission, current_time):
+    # the A1 visit of an attempt, or None when the admission control turns it away
+    if admission is not None and not admission.admit(current_time):
+        return None
+    job = Job(current_time, JobType.A1)
+    server_a.process_arrival(job)
+    server_a.jobs_stats[0].update_avg_interarrival(current_time)
+    return job
+
+
+def get_routing(completed_job):
+    # the types of the next visits of the request of a completed job
+    if completed_job.fork is not None:
+        return FORK_ROUTING[completed_job.job_type]
+    return ROUTING[completed_job.job_type],
+
+
+def get_edge(job_type, next_job_type):
+    # the job type keying the delay between two visits, None within a node
+    if NODES[job_type] == NODES[next_job_type]:
+        return None
+    return JobType.A2 if next_job_type == JobType.P else job_type
+
+
+def get_visit(completed_job, job_type, current_time, auth, b_improvement):
+    # the job of a next visit of the request of a completed job
+    if job_type == JobType.B:
+        job = Job(current_time, job_type, b_improvement=b_improvement)
+    elif job_type == JobType.A2:
+        job = Job(current_time, job_type)
+    else:
+        job = Job(current_time, job_type, auth)
+    job.start = completed_job.start
+    job.fork = completed_job.fork
+    return job
+
+
+def simulate(arrival_rate, auth, b=0, k=0, b_improvement=False, cores=CORES, limits=LIMITS, disciplines=DISCIPLINES,
+             admission=None, retry=None, delays=None, fork_join=None):
+    # yields one observation per batch of b arrivals (k = 0 streams batches until the caller stops),
+    # or a single observation for the whole run when b = 0; cores, limits and disciplines are given for A, B
+    # and P, and with any limit the observations also split the time in each node into wait and in-service time.
+    # With an admission control, rejected A1 arrivals still count in the batch but never enter the network.
+    # With a retry policy, batches still count first attempts only, and every node must be PS.
+    # delays maps the source job type of a routing edge to the DelayNode on it, and the A to P edge of a fork
+    # takes the delay of A2. A forked request is two jobs at once, which timeouts do not follow; the quotas count
+    # it at both B and P
+    if retry is not None and any(discipline != Discipline.PS for discipline in disciplines):
+        raise ValueError("timeouts abandon jobs only from processor sharing nodes")
+    if fork_join is not None and retry is not None:
+        raise ValueError("timeouts follow a single job per request")
     global arrivalTemp
     arrivalTemp = START
-    batch_enabled = b != 0 and k != 0
+    batch_enabled = b != 0
+    stop = INFINITY if batch_enabled else STOP  # batches run on a continuous clock until k are collected
 
-    server_a = Server()
+    server_a = get_server(disciplines[0], cores[0], limits[0])
     server_a.jobs_stats.append(JobStats(JobType.A1))
     server_a.jobs_stats.append(JobStats(JobType.A2))
     server_a.jobs_stats.append(JobStats(JobType.A3))
-    server_b = Server()
-    server_p = Server()
+    server_b = get_server(disciplines[1], cores[1], limits[1])
+    server_p = get_server(disciplines[2], cores[2], limits[2])
 
     t = Time()
 
     t.current = START  # set the clock
     t.arrival_a = get_arrival(arrival_rate)  # schedule the first arrival_a
+    if admission is not None:
+        admission.reset(t.current)
+    clients = None if retry is None else Clients(retry)
+    transfers = None if delays is None else Transfers(delays)
+    servers = [server_a, server_b, server_p]
 
     arrivals_a1 = 0  # batch measure index
-    means = []
+    batches = 0
+    batch_start = START  # epoch of the current batch
 
-    while t.arrival_a < STOP or server_a.number > 0 or server_b.number > 0 or server_p.number > 0:
+    while (t.arrival_a < stop or server_a.number > 0 or server_b.number > 0 or server_p.number > 0 or
+           clients is not None and clients.requests or transfers is not None and transfers.heap):
 
-        t.next = min(t.arrival_a, t.completion_a, t.completion_b, t.completion_p)  # next event time
-
-        # update integrals
-        if server_a.number > 0:
-            server_a.area.update(t.current, t.next, server_a.number)
-        if server_b.number > 0:
-            server_b.area.update(t.current, t.next, server_b.number)
-        if server_p.number > 0:
-            server_p.area.update(t.current, t.next, server_p.number)
+        if clients is not None:
+            t.timer = clients.get_next_timer()
+        if transfers is not None:
+            t.transfer = transfers.get_next_transfer()
+        t.next = min(t.arrival_a, t.completion_a, t.completion_b, t.completion_p, t.timer,
+                     t.transfer)  # next event time
 
         t.current = t.next  # advance the clock
+        sent = None  # completed job whose request moves on to its next visits
+        arrived = []  # (completed job, type of the next visit) past the delay of their edge
 
         # arrival_a1
         if t.current == t.arrival_a:
-            server_a.process_arrival(Job(t.arrival_a, JobType.A1))
-            server_a.jobs_stats[0].update_avg_interarrival(t.current)
+            job = admit_request(server_a, admission, t.current)
+            if job is not None:
+                t.completion_a = t.current + server_a.get_next_complete_process_time()
+            if clients is not None:
+                clients.try_request(clients.start(t.current), job, t.current)
             t.arrival_a = get_arrival(arrival_rate)
-            if t.arrival_a > STOP:
+            if t.arrival_a > stop:
                 t.last = t.current
                 t.arrival_a = INFINITY
-            t.completion_a = t.current + server_a.get_next_complete_process_time()
             arrivals_a1 += 1
 
         # completion_a
@@ -257,14 +964,18 @@ def model(arrival_rate, auth, b=0, k=0, b_improvement=False):
 
             if completed_job.job_type == JobType.A1:
                 server_a.jobs_stats[0].update_avg_service(completed_job, t.current)
-                server_b.process_arrival(Job(t.completion_a, JobType.B, b_improvement=b_improvement))
-                t.completion_b = t.current + server_b.get_next_complete_process_time()
+                sent = completed_job
             elif completed_job.job_type == JobType.A2:
                 server_a.jobs_stats[1].update_avg_service(completed_job, t.current)
-                server_p.process_arrival(Job(t.current, JobType.P, auth))
-                t.completion_p = t.current + server_p.get_next_complete_process_time()
+                sent = completed_job
             else:
                 server_a.jobs_stats[2].update_avg_service(completed_job, t.current)
+                if admission is not None:
+                    admission.move(JobType.A3)
+                if clients is not None:
+                    clients.complete(completed_job, t.current)
+                if fork_join is not None:
+                    fork_join.complete(completed_job, t.current)
 
             if server_a.number > 0:
                 t.completion_a = t.current + server_a.get_next_complete_process_time()
@@ -273,10 +984,7 @@ def model(arrival_rate, auth, b=0, k=0, b_improvement=False):
 
         # completion_b
         elif t.current == t.completion_b:
-            server_b.process_completion(t.completion_b)
-            server_a.process_arrival(Job(t.current, JobType.A2))
-            server_a.jobs_stats[1].update_avg_interarrival(t.current)
-            t.completion_a = t.current + server_a.get_next_complete_process_time()
+            sent = server_b.process_completion(t.completion_b)
 
             if server_b.number > 0:
                 t.completion_b = t.current + server_b.get_next_complete_process_time()
@@ -285,112 +993,268 @@ def model(arrival_rate, auth, b=0, k=0, b_improvement=False):
 
         # completion_p
         elif t.current == t.completion_p:
-            server_p.process_completion(t.completion_p)
-
-            server_a.process_arrival(Job(t.current, JobType.A3, auth))
-            server_a.jobs_stats[2].update_avg_interarrival(t.current)
-            t.completion_a = t.current + server_a.get_next_complete_process_time()
+            sent = server_p.process_completion(t.completion_p)
 
             if server_p.number > 0:
                 t.completion_p = t.current + server_p.get_next_complete_process_time()
             else:
                 t.completion_p = INFINITY
 
+        # timeout or retry of a request
+        elif t.current == t.timer:
+            request = clients.pop_timer()
+            if request.job is None:
+                job = admit_request(server_a, admission, t.current)
+                if job is not None:
+                    t.completion_a = t.current + server_a.get_next_complete_process_time()
+                clients.try_request(request, job, t.current)
+            elif request.node == TRANSIT:
+                # timeout in a delay: the transfer is dropped when it ends
+                if admission is not None:
+                    admission.move(ROUTING[request.job.job_type])
+                request.job.request = None
+                clients.abandoned += 1
+                clients.fail(request, t.current)
+            else:
+                # timeout: the attempt leaves the node of its current visit
+                server = servers[request.node]
+                request.work[request.node] += server.abandon(request.job, t.current)
+                if admission is not None:
+                    admission.move(request.job.job_type)
+                completion = t.current + server.get_next_complete_process_time() if server.number > 0 else INFINITY
+                t.set_completion(request.node, completion)
+                clients.abandoned += 1
+                clients.fail(request, t.current)
+
+        # end of a delay
+        elif t.current == t.transfer:
+            completed_job, job_type = transfers.receive()
+            if clients is None or completed_job.request is not None:  # else its request timed out in the delay
+                arrived.append((completed_job, job_type))
+
+        if sent is not None:
+            if clients is not None:
+                clients.hand_over(sent, NODES[sent.job_type])
+            if fork_join is not None and sent.job_type == JobType.A1 and fork_join.is_forked():
+                sent.fork = fork_join.fork(t.current)
+            routing = get_routing(sent)
+            if admission is not None:
+                admission.route(sent.job_type, () if sent.fork is not None and routing == (JobType.A2,) else routing)
+            for job_type in routing:
+                edge = get_edge(sent.job_type, job_type)
+                if transfers is not None and edge in delays:
+                    transfers.send(sent, job_type, edge, t.current)
+                else:
+                    arrived.append((sent, job_type))
+
+        for completed_job, job_type in arrived:
+            if completed_job.fork is not None and job_type == JobType.A2 and not fork_join.join(completed_job,
+                                                                                                t.current):
+                continue  # its sibling is still out
+            if admission is not None and completed_job.fork is not None and job_type == JobType.A2:
+                admission.route(next_job_types=(JobType.A2,))
+            job = get_visit(completed_job, job_type, t.current, auth, b_improvement)
+            node = NODES[job_type]
+            servers[node].process_arrival(job)
+            if node == 0:
+                server_a.jobs_stats[job_type.value - 1].update_avg_interarrival(t.current)
+            t.set_completion(node, t.current + servers[node].get_next_complete_process_time())
+            if clients is not None:
+                clients.receive(completed_job, job, node)
+
         if batch_enabled and arrivals_a1 == b:
             (avg_population, avg_population_a, avg_population_b, avg_population_p, avg_response_time, utilization_a,
-             utilization_b, utilization_p) = (get_simulation_statistics(server_a, server_b, server_p, t.current))
-
-            means.append(
-                [server_a.avg_interarrival, server_a.avg_service, avg_population_a, utilization_a, server_a.index,
-                 server_b.avg_interarrival, server_b.avg_service, avg_population_b, utilization_b, server_b.index,
-                 server_p.avg_interarrival, server_p.avg_service, avg_population_p, utilization_p, server_p.index,
-                 avg_response_time, avg_population])
+             utilization_b, utilization_p) = (get_simulation_statistics(server_a, server_b, server_p, t.current, batch_start))
+
+            observation = [server_a.avg_interarrival, server_a.avg_service, avg_population_a, utilization_a,
+                           server_a.index,
+                           server_b.avg_interarrival, server_b.avg_service, avg_population_b, utilization_b,
+                           server_b.index,
+                           server_p.avg_interarrival, server_p.avg_service, avg_population_p, utilization_p,
+                           server_p.index,
+                           avg_response_time, avg_population]
+            if any(limits):
+                observation += get_wait_statistics(server_a, server_b, server_p)
+            if admission is not None:
+                observation += get_admission_statistics(admission, server_a, t.current, batch_start)
+                admission.attempts = 0
+                admission.rejected = 0
+            if clients is not None:
+                observation += get_retry_statistics(clients, server_a, server_b, server_p, arrivals_a1, t.current,
+                                                    batch_start)
+                clients.reset_stats()
+            if transfers is not None:
+                observation += get_delay_statistics(transfers, avg_response_time)
+                transfers.reset_stats()
+            if fork_join is not None:
+                observation += get_fork_join_statistics(fork_join, arrivals_a1)
+                fork_join.reset_stats()
+            yield observation
 
             arrivals_a1 = 0
-            t.completion_a -= t.current
-            t.completion_b -= t.current
-            t.completion_p -= t.current
-            t.arrival_a -= t.current
-            t.current = START
-            arrivalTemp = START
+            batch_start = t.current
 
             server_a.reset_stats(t.current)
             server_b.reset_stats(t.current)
             server_p.reset_stats(t.current)
 
-            for j in server_a.jobs:
-                j.arrival = t.current
             for j in server_a.jobs_stats:
-                j.reset_stats()
-            for j in server_b.jobs:
-                j.arrival = t.current
-            for j in server_p.jobs:
-                j.arrival = t.current
-
-            if len(means) == k:
-                data = []
-                for i in range(17):
-                    mean = 0
-
-                    for m in means:
-                        mean += m[i]
-                    mean /= k
-                    data.append(mean)
-                    n = 0
-                    for m in means:
-                        n += pow((m[i] - mean), 2)
-                    data.append(idfStudent(k - 1, 1 - ALPHA / 2) * np.sqrt(n / (k - 1)) / np.sqrt(k - 1))
-
-                return data
+                j.reset_stats(t.current)
+
+            batches += 1
+            if batches == k:
+                return
 
     (avg_population, avg_population_a, avg_population_b, avg_population_p, avg_response_time, utilization_a,
      utilization_b, utilization_p) = get_simulation_statistics(server_a, server_b, server_p, t.current)
 
-    return [server_a.avg_interarrival, server_a.avg_service, avg_population_a, utilization_a, server_a.index,
-            server_b.avg_interarrival, server_b.avg_service, avg_population_b, utilization_b, server_b.index,
-            server_p.avg_interarrival, server_p.avg_service, avg_population_p, utilization_p, server_p.index,
-            avg_response_time, avg_population]
-
-
-def get_simulation_statistics(server_a, server_b, server_p, current_time):
-    avg_population_a = server_a.area.node / current_time
-    utilization_a = server_a.area.service / current_time
-    avg_population_b = server_b.area.node / current_time
-    utilization_b = server_b.area.service / current_time
-    avg_population_p = server_p.area.node / current_time
-    utilization_p = server_p.area.service / current_time
+    observation = [server_a.avg_interarrival, server_a.avg_service, avg_population_a, utilization_a, server_a.index,
+                   server_b.avg_interarrival, server_b.avg_service, avg_population_b, utilization_b, server_b.index,
+                   server_p.avg_interarrival, server_p.avg_service, avg_population_p, utilization_p, server_p.index,
+                   avg_response_time, avg_population]
+    if any(limits):
+        observation += get_wait_statistics(server_a, server_b, server_p)
+    if admission is not None:
+        observation += get_admission_statistics(admission, server_a, t.current)
+    if clients is not None:
+        observation += get_retry_statistics(clients, server_a, server_b, server_p, arrivals_a1, t.current)
+    if transfers is not None:
+        observation += get_delay_statistics(transfers, avg_response_time)
+    if fork_join is not None:
+        observation += get_fork_join_statistics(fork_join, arrivals_a1)
+    yield observation
+
+
+def get_batch_means(means):
+    k = len(means)
+    data = []
+    for i in range(len(means[0])):
+        mean = 0
+
+        for m in means:
+            mean += m[i]
+        mean /= k
+        data.append(mean)
+        n = 0
+        for m in means:
+            n += pow((m[i] - mean), 2)
+        data.append(idfStudent(k - 1, 1 - ALPHA / 2) * np.sqrt(n / (k - 1)) / np.sqrt(k - 1))
+
+    return data
+
+
+def get_curvature(rates, response_times, i):
+    # second derivative of the response time curve at the i-th rate of a non uniform grid
+    if i == 0 or i == len(rates) - 1:
+        return 0.0
+    left = (response_times[i] - response_times[i - 1]) / (rates[i] - rates[i - 1])
+    right = (response_times[i + 1] - response_times[i]) / (rates[i + 1] - rates[i])
+    return 2 * (right - left) / (rates[i + 1] - rates[i - 1])
+
+
+def get_refinement(results):
+    # midpoint of the interval where linear interpolation is least trustworthy: the interpolation error
+    # |f''| h^2 / 8 from the curvature at its ends plus the ci of its ends, over the width h of the interval
+    rates = sorted(results)
+    response_times = [results[rate][RESPONSE_TIME] for rate in rates]
+    cis = [results[rate][RESPONSE_TIME + 1] for rate in rates]
+    best_score = -1
+    best_rate = None
+    for i in range(len(rates) - 1):
+        h = rates[i + 1] - rates[i]
+        curvature = max(abs(get_curvature(rates, response_times, i)), abs(get_curvature(rates, response_times, i + 1)))
+        score = (curvature * h * h / 8 + (cis[i] + cis[i + 1]) / 2) * h
+        rate = round((rates[i] + rates[i + 1]) / 2, 4)
+        if score > best_score and rate not in results:
+            best_score = score
+            best_rate = rate
+    return best_rate
+
+
+def adaptive_batch_means(auth, seed, b_improvement=False, min_rate=0.5, max_rate=1.2, points=5, budget=BUDGET):
+    # starts from a coarse uniform grid and spends the rest of the budget on the intervals picked by
+    # get_refinement; returns the batch means by arrival rate
+    results = {}
+    arrival_rates = [round(min_rate + (max_rate - min_rate) * i / (points - 1), 4) for i in range(points)]
+    while len(results) < budget:
+        if arrival_rates:
+            arrival_rate = arrival_rates.pop(0)
+        else:
+            arrival_rate = get_refinement(results)
+            if arrival_rate is None:
+                break
+        plant_seeds(seed)
+        print(f"Adaptive Batch Means: arrival_rate {arrival_rate}, auth type {auth}, improvement {b_improvement} "
+              f"({len(results) + 1}/{budget})")
+        results[arrival_rate] = model(arrival_rate, auth, B, K, b_improvement)
+    return results
+
+
+def get_simulation_statistics(server_a, server_b, server_p, current_time, start_time=START):
+    server_a.update_area(current_time)
+    server_b.update_area(current_time)
+    server_p.update_area(current_time)
+    elapsed = current_time - start_time
+    avg_population_a = server_a.area.node / elapsed
+    utilization_a = server_a.area.service / elapsed
+    avg_population_b = server_b.area.node / elapsed
+    utilization_b = server_b.area.service / elapsed
+    avg_population_p = server_p.area.node / elapsed
+    utilization_p = server_p.area.service / elapsed
     avg_response_time = (server_a.jobs_stats[0].avg_service + server_a.jobs_stats[1].avg_service +
                          server_a.jobs_stats[2].avg_service + server_b.avg_service + server_p.avg_service)
-    avg_population = server_a.area.node / current_time + server_b.area.node / current_time + server_p.area.node / current_time
+    avg_population = server_a.area.node / elapsed + server_b.area.node / elapsed + server_p.area.node / elapsed
     return (avg_population,
             avg_population_a, avg_population_b, avg_population_p,
             avg_response_time,
             utilization_a, utilization_b, utilization_p)
 
 
+def get_wait_statistics(server_a, server_b, server_p):
+    return [server_a.avg_wait, server_a.avg_in_service,
+            server_b.avg_wait, server_b.avg_in_service,
+            server_p.avg_wait, server_p.avg_in_service]
+
+
+def get_admission_statistics(admission, server_a, current_time, start_time=START):
+    # requests completed per unit time, and the fraction of the attempts turned away
+    return [server_a.jobs_stats[2].index / (current_time - start_time),
+            admission.rejected / max(admission.attempts, 1)]
+
+
+def get_retry_statistics(clients, server_a, server_b, server_p, arrivals, current_time, start_time=START):
+    # visits per first attempt against the 3, 1 and 1 of a request that never times out, the work per unit time
+    # lost to abandoned attempts at each node, the abandoned attempts over all, the requests out of retries over
+    # the first attempts and the time from the first attempt of the succeeded requests
+    elapsed = current_time - start_time
+    arrivals = max(arrivals, 1)
+    return [server_a.arrivals / (3 * arrivals), server_b.arrivals / arrivals, server_p.arrivals / arrivals,
+            clients.wasted[0] / elapsed, clients.wasted[1] / elapsed, clients.wasted[2] / elapsed,
+            clients.abandoned / max(clients.attempts, 1), clients.failed / arrivals,
+            clients.request_time / max(clients.succeeded, 1)]
+
+
+def get_delay_statistics(transfers, avg_response_time):
+    # the delay of each edge, their sum over the path of a request and the response time it adds up to;
+    # an edge without a delay takes none
+    avg_delays = [transfers.delays[job_type].avg_delay if job_type in transfers.delays else 0.0
+                  for job_type in EDGES]
+    return avg_delays + [sum(avg_delays), avg_response_time + sum(avg_delays)]
+
+
+def get_fork_join_statistics(fork_join, arrivals):
+    # the forks per arrival, the time from a fork to its join and the part of it the first sibling back waits,
+    # and the response time of the requests as they see it, which avg_response_time overstates for a fork
+    return [fork_join.forks / max(arrivals, 1), fork_join.fork_time / max(fork_join.joins, 1),
+            fork_join.join_wait / max(fork_join.joins, 1), fork_join.request_time / max(fork_join.requests, 1)]
+
+
 def obj_1_2_batch_means_simulation():
     start = datetime.now()
     seed = 123456789
     print("Start Batch Means Simulation")
     with open('data_obj_1_2_batch_means.csv', 'w', newline='') as csvfile:
-        fieldnames = ['auth', 'arrival_rate',
-                      'interarrival_a', 'interarrival_a_ci',
-                      'avg_service_a', 'avg_service_a_ci',
-                      'avg_population_a', 'avg_population_a_ci',
-                      'utilization_a', 'utilization_a_ci',
-                      'completion_a', 'completion_a_ci',
-                      'interarrival_b', 'interarrival_b_ci',
-                      'avg_service_b', 'avg_service_b_ci',
-                      'avg_population_b', 'avg_population_b_ci',
-                      'utilization_b', 'utilization_b_ci',
-                      'completion_b', 'completion_b_ci',
-                      'interarrival_p', 'interarrival_p_ci',
-                      'avg_service_p', 'avg_service_p_ci',
-                      'avg_population_p', 'avg_population_p_ci',
-                      'utilization_p', 'utilization_p_ci',
-                      'completion_p', 'completion_p_ci',
-                      'avg_response_time', 'avg_response_time_ci',
-                      'avg_population', 'avg_population_ci']
+        fieldnames = ['auth', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES
         writer = csv.writer(csvfile)
         writer.writerow(fieldnames)
 
@@ -408,29 +1272,53 @@ def obj_1_2_batch_means_simulation():
     print(f"Batch Means Simulation time: {end - start}\n")
 
 
+def obj_1_2_batch_stream_simulation():
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Stream Simulation")
+    with open('data_obj_1_2_batch_stream.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'arrival_rate', 'batch'] + BATCH_MEANS_FIELDNAMES[::2]
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        auth_types = [1, 2]
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+        for auth in auth_types:
+            for arrival_rate in arrival_rates:
+                plant_seeds(seed)
+                print(f"Batch Stream: arrival_rate {arrival_rate} and auth type {auth}")
+                for batch, observation in enumerate(simulate(arrival_rate, auth, B, K)):
+                    writer.writerow([auth, arrival_rate, batch] + observation)
+
+    end = datetime.now()
+    print(f"Batch Stream Simulation time: {end - start}\n")
+
+
+def obj_1_2_adaptive_batch_means_simulation():
+    start = datetime.now()
+    seed = 123456789
+    print("Start Adaptive Batch Means Simulation")
+    with open('data_obj_1_2_adaptive_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        auth_types = [1, 2]
+        for auth in auth_types:
+            results = adaptive_batch_means(auth, seed)
+            for arrival_rate in sorted(results):
+                writer.writerow([auth, arrival_rate] + results[arrival_rate])
+
+    end = datetime.now()
+    print(f"Adaptive Batch Means Simulation time: {end - start}\n")
+
+
 def obj3_batch_means_simulation():
     start = datetime.now()
     seed = 123456789
     print("Start Batch Means Simulation Objective 3")
     with open('data_obj_3_batch_means.csv', 'w', newline='') as csvfile:
-        fieldnames = ['b_improvement', 'arrival_rate',
-                      'interarrival_a', 'interarrival_a_ci',
-                      'avg_service_a', 'avg_service_a_ci',
-                      'avg_population_a', 'avg_population_a_ci',
-                      'utilization_a', 'utilization_a_ci',
-                      'completion_a', 'completion_a_ci',
-                      'interarrival_b', 'interarrival_b_ci',
-                      'avg_service_b', 'avg_service_b_ci',
-                      'avg_population_b', 'avg_population_b_ci',
-                      'utilization_b', 'utilization_b_ci',
-                      'completion_b', 'completion_b_ci',
-                      'interarrival_p', 'interarrival_p_ci',
-                      'avg_service_p', 'avg_service_p_ci',
-                      'avg_population_p', 'avg_population_p_ci',
-                      'utilization_p', 'utilization_p_ci',
-                      'completion_p', 'completion_p_ci',
-                      'avg_response_time', 'avg_response_time_ci',
-                      'avg_population', 'avg_population_ci']
+        fieldnames = ['b_improvement', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES
         writer = csv.writer(csvfile)
         writer.writerow(fieldnames)
 
@@ -457,11 +1345,190 @@ def obj3_batch_means_simulation():
     print(f"Objective 3 Batch Means Simulation time: {end - start}\n")
 
 
+def obj3_cores_batch_means_simulation():
+    # scale up of B: a second core against the halved demand of b_improvement
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Objective 3 Cores")
+    with open('data_obj_3_cores_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['b_improvement', 'cores_a', 'cores_b', 'cores_p', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2, 1.25,
+                         1.3, 1.35, 1.4]
+        for b_improvement, cores in [(True, CORES), (False, (1, 2, 1))]:
+            for arrival_rate in arrival_rates:
+                plant_seeds(seed)
+                print(f"Objective 3 Cores: arrival_rate {arrival_rate}, improvement {b_improvement}, cores {cores}")
+                data = [b_improvement] + list(cores) + [arrival_rate]
+                data += model(arrival_rate, 1, B, K, b_improvement, cores)
+                writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Objective 3 Cores Batch Means Simulation time: {end - start}\n")
+
+
+def obj_pool_batch_means_simulation():
+    # connection pool of P: limited processor sharing with pools of several sizes, against unlimited PS
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Pool")
+    with open('data_obj_pool_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'limit_p', 'arrival_rate'] + LIMITED_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        arrival_rates = [0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2]
+        for auth in [1, 2]:
+            for limit in [1, 2, 4, 8, 0]:
+                for arrival_rate in arrival_rates:
+                    plant_seeds(seed)
+                    print(f"Pool: arrival_rate {arrival_rate}, auth type {auth}, limit of P {limit}")
+                    data = [auth, limit, arrival_rate]
+                    # an unreachable limit for unlimited PS, to keep the wait columns
+                    data += model(arrival_rate, auth, B, K, limits=(0, 0, limit if limit else INFINITY))
+                    writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Pool Batch Means Simulation time: {end - start}\n")
+
+
+def obj_discipline_batch_means_simulation():
+    # scheduling of the A1, A2 and A3 visits competing at A
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Discipline")
+    with open('data_obj_discipline_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'discipline_a', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        arrival_rates = [0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2]
+        for auth in [1, 2]:
+            for discipline in Discipline:
+                for arrival_rate in arrival_rates:
+                    plant_seeds(seed)
+                    print(f"Discipline: arrival_rate {arrival_rate}, auth type {auth}, "
+                          f"discipline of A {discipline.name}")
+                    data = [auth, discipline.name, arrival_rate]
+                    data += model(arrival_rate, auth, B, K, disciplines=(discipline, Discipline.PS, Discipline.PS))
+                    writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Discipline Batch Means Simulation time: {end - start}\n")
+
+
+def obj_admission_batch_means_simulation():
+    # overload beyond the saturation of B, at about 1.25 requests per unit time, behind each admission control
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Admission")
+    with open('data_obj_admission_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['admission', 'arrival_rate'] + ADMISSION_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        admissions = {'token_bucket': AdmissionControl(rate=1.1, burst=10),
+                      'max_in_flight': AdmissionControl(max_in_flight=20),
+                      'quota_b': AdmissionControl(quotas={JobType.B: 8})}
+        arrival_rates = [0.8, 1.0, 1.2, 1.4, 1.6, 1.8, 2.0]
+        for name, admission in admissions.items():
+            for arrival_rate in arrival_rates:
+                plant_seeds(seed)
+                print(f"Admission: arrival_rate {arrival_rate}, {name}")
+                data = [name, arrival_rate]
+                data += model(arrival_rate, 1, B, K, admission=admission)
+                writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Admission Batch Means Simulation time: {end - start}\n")
+
+
+def obj_retry_batch_means_simulation():
+    # retry storms: timeouts with and without retries, near and past the saturation of B
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Retry")
+    with open('data_obj_retry_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['timeout', 'retries', 'arrival_rate'] + RETRY_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        arrival_rates = [0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4]
+        for timeout in [15.0, 30.0]:
+            for retries in [0, 3]:
+                for arrival_rate in arrival_rates:
+                    plant_seeds(seed)
+                    print(f"Retry: arrival_rate {arrival_rate}, timeout {timeout}, retries {retries}")
+                    data = [timeout, retries, arrival_rate]
+                    data += model(arrival_rate, 1, B, K, retry=RetryPolicy(timeout, retries))
+                    writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Retry Batch Means Simulation time: {end - start}\n")
+
+
+def obj_delay_batch_means_simulation():
+    # the same network latency on every edge, with the distributions of its delay
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Delay")
+    with open('data_obj_delay_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['latency', 'distribution', 'arrival_rate'] + DELAY_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        arrival_rates = [0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2]
+        for latency in [0.05, 0.5]:
+            for distribution in [Distribution.CONSTANT, Distribution.EXPONENTIAL, Distribution.LOGNORMAL]:
+                for arrival_rate in arrival_rates:
+                    plant_seeds(seed)
+                    print(f"Delay: arrival_rate {arrival_rate}, latency {latency}, {distribution.name}")
+                    delays = {job_type: DelayNode(latency, distribution, 4.0) for job_type in EDGES}
+                    data = [latency, distribution.name, arrival_rate]
+                    data += model(arrival_rate, 1, B, K, delays=delays)
+                    writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Delay Batch Means Simulation time: {end - start}\n")
+
+
+def obj_fork_join_batch_means_simulation():
+    # the sequential chain against B and P called in parallel, for no, half and all of the requests
+    start = datetime.now()
+    seed = 123456789
+    print("Start Batch Means Simulation Fork Join")
+    with open('data_obj_fork_join_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['share', 'arrival_rate'] + FORK_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        arrival_rates = [0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2]
+        for share in [0.0, 0.5, 1.0]:
+            for arrival_rate in arrival_rates:
+                plant_seeds(seed)
+                print(f"Fork Join: arrival_rate {arrival_rate}, share {share}")
+                data = [share, arrival_rate] + model(arrival_rate, 1, B, K, fork_join=ForkJoin(share))
+                writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Fork Join Batch Means Simulation time: {end - start}\n")
+
+
 def main():
     start = datetime.now()
 
     # obj_1_2_batch_means_simulation()
+    # obj_1_2_adaptive_batch_means_simulation()
     obj3_batch_means_simulation()
+    # obj3_cores_batch_means_simulation()
+    # obj_pool_batch_means_simulation()
+    # obj_discipline_batch_means_simulation()
+    # obj_admission_batch_means_simulation()
+    # obj_retry_batch_means_simulation()
+    # obj_delay_batch_means_simulation()
+    # obj_fork_join_batch_means_simulation()
 
     end = datetime.now()
     print(f"Total Simulation time: {end - start}\n")
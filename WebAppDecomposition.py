@@ -0,0 +1,134 @@
+import csv
+from datetime import datetime
+
+from WebAppDES import B, JobType, get_avg_demand
+
+INFINITY = float('inf')  # metrics of an unstable node
+
+
+def get_hyper_scv(p):
+    # squared coefficient of variation of the balanced-means hyperexponential of WebAppHyperDES.get_arrival
+    return 1 / (2 * p) + 1 / (2 * (1 - p)) - 1
+
+
+def split_scv(scv, q):
+    # a renewal flow thinned with probability q
+    return q * scv + 1 - q
+
+
+def departure_scv(arrival_scv, utilization):
+    # PS departures are insensitive to the demand distribution, so the node is treated as exponential
+    utilization = min(utilization, 1)
+    return utilization * utilization + (1 - utilization * utilization) * arrival_scv
+
+
+def get_stretch(arrival_scv, utilization):
+    # per-visit response over demand of a PS node: 1 / (1 - U) with Poisson arrivals,
+    # scaled by the arrival variability with the two-moment (Allen-Cunneen) correction
+    if utilization >= 1:
+        return INFINITY
+    return 1 + utilization / (1 - utilization) * (arrival_scv + 1) / 2
+
+
+def model(arrival_rate, auth=1, arrival_scv=1.0, replicas=1, b=B, b_improvement=False):
+    demands_a = [get_avg_demand(job_type, auth, b_improvement) for job_type in (JobType.A1, JobType.A2, JobType.A3)]
+    demand_a = sum(demands_a)
+    demand_b = get_avg_demand(JobType.B, auth, b_improvement)
+    demand_p = get_avg_demand(JobType.P, auth, b_improvement)
+
+    # each replica of A gets every class at rate arrival_rate / replicas through random dispatch
+    arrival_rate_a = 3 * arrival_rate / replicas
+    utilization_a = arrival_rate * demand_a / replicas
+    utilization_b = arrival_rate * demand_b
+    utilization_p = arrival_rate * demand_p
+
+    # the chain A1 -> B -> A2 -> P -> A3 is followed one class at a time, since each flow is the
+    # previous class leaving its node; random dispatch thins every class flow entering a replica of A
+    scv_a1 = split_scv(arrival_scv, 1 / replicas)
+    scv_in_b = departure_scv(scv_a1, utilization_a)
+    scv_a2 = split_scv(departure_scv(scv_in_b, utilization_b), 1 / replicas)
+    scv_in_p = departure_scv(scv_a2, utilization_a)
+    scv_a3 = split_scv(departure_scv(scv_in_p, utilization_p), 1 / replicas)
+    # superposition of the three class flows at a replica of A, weighted by rate
+    scv_a = (scv_a1 + scv_a2 + scv_a3) / 3
+
+    avg_demand_a = demand_a / 3
+    avg_service_a = avg_demand_a * get_stretch(scv_a, utilization_a)
+    avg_service_b = demand_b * get_stretch(scv_in_b, utilization_b)
+    avg_service_p = demand_p * get_stretch(scv_in_p, utilization_p)
+
+    # Little's law on every node
+    avg_population_a = arrival_rate_a * avg_service_a
+    avg_population_b = arrival_rate * avg_service_b
+    avg_population_p = arrival_rate * avg_service_p
+
+    avg_response_time = 3 * avg_service_a + avg_service_b + avg_service_p
+    avg_population = replicas * avg_population_a + avg_population_b + avg_population_p
+
+    # completions are the visits generated by a batch of b arrivals
+    data = []
+    for _ in range(replicas):
+        data += [1.0 / arrival_rate_a, avg_service_a, avg_population_a, min(utilization_a, 1), 3 * b / replicas]
+    data += [1.0 / arrival_rate, avg_service_b, avg_population_b, min(utilization_b, 1), b,
+             1.0 / arrival_rate, avg_service_p, avg_population_p, min(utilization_p, 1), b,
+             avg_response_time, avg_population]
+    return data
+
+
+def read_batch_means(filename):
+    with open(filename, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        fieldnames = next(reader)
+        for row in reader:
+            yield dict(zip(fieldnames, row))
+
+
+def get_relative_error(approximate, simulated):
+    return (approximate - simulated) / simulated
+
+
+def benchmark():
+    start = datetime.now()
+    print("Start Decomposition Benchmark")
+    errors = []
+    with open('data_decomposition_benchmark.csv', 'w', newline='') as csvfile:
+        fieldnames = ['model', 'p', 'arrival_rate',
+                      'avg_response_time', 'avg_response_time_ci', 'avg_response_time_approx',
+                      'avg_response_time_error',
+                      'avg_population', 'avg_population_ci', 'avg_population_approx', 'avg_population_error']
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        grid = []
+        for row in read_batch_means('data_hyper_batch_means.csv'):
+            p = float(row['p'])
+            grid.append(('hyper', p, row, model(float(row['arrival_rate']), 1, get_hyper_scv(p))))
+        for row in read_batch_means('data_horizontalA_batch_means.csv'):
+            grid.append(('horizontalA', '', row, model(float(row['arrival_rate']), 1, replicas=2,
+                                                       b_improvement=True)))
+
+        for name, p, row, data in grid:
+            response_time = float(row['avg_response_time'])
+            population = float(row['avg_population'])
+            response_time_error = get_relative_error(data[-2], response_time)
+            population_error = get_relative_error(data[-1], population)
+            errors.append(abs(response_time_error))
+            writer.writerow([name, p, row['arrival_rate'],
+                             response_time, row['avg_response_time_ci'], data[-2], response_time_error,
+                             population, row['avg_population_ci'], data[-1], population_error])
+            print(f"Decomposition {name} p {p} arrival_rate {row['arrival_rate']}: "
+                  f"response time {data[-2]:.4f} vs {response_time:.4f} ({100 * response_time_error:+.1f}%)")
+
+    errors.sort()
+    print(f"Response time relative error: mean {100 * sum(errors) / len(errors):.1f}%, "
+          f"median {100 * errors[len(errors) // 2]:.1f}%, max {100 * errors[-1]:.1f}%")
+    end = datetime.now()
+    print(f"Decomposition Benchmark time: {end - start}\n")
+
+
+def main():
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
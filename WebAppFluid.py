@@ -0,0 +1,195 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+
+from WebAppDES import JobType, get_avg_demand
+from WebAppMVA import get_saturation_rate, model as mva_model
+
+START = 0.0  # initial time
+STOP = 86400.0  # terminal time of the arrivals, as in WebAppConvDES
+CAMP_INTERVAL = 300
+STEP = 1.0  # integration step, any is stable for the implicit scheme
+EMPTY = 1e-3  # population below which the drained network is considered empty
+NEWTON = 20  # iterations of an implicit step at most
+TOLERANCE = 1e-12  # Newton correction at which an implicit step stops
+STEADY = 1e-9  # derivative norm below which the network is at its steady state
+
+CLASSES = [JobType.A1, JobType.B, JobType.A2, JobType.P, JobType.A3]  # visit order of a request
+NODES = [0, 1, 0, 2, 0]  # node of each class: A, B, A, P, A
+# the derivatives are ARRIVAL * arrival_rate + ROUTING @ flows: each class gains the flow of the one before it
+ARRIVAL = np.array([1.0, 0.0, 0.0, 0.0, 0.0])
+ROUTING = np.eye(5, k=-1) - np.eye(5)
+
+
+def get_demands(auth=1, b_improvement=False):
+    return [get_avg_demand(job_type, auth, b_improvement) for job_type in CLASSES]
+
+
+def get_populations(x):
+    population_a = x[0] + x[2] + x[4]
+    return population_a, x[1], x[3]
+
+
+def get_flows(x, demands):
+    # pointwise stationary fluid approximation of a PS node: the node works at rate N / (1 + N)
+    # (M/M/1 utilization for a mean population N) and shares it in proportion to the class populations,
+    # so the class c leaves at rate x_c / (d_c (1 + N))
+    population_a, population_b, population_p = get_populations(x)
+    population = [population_a, population_b, population_a, population_p, population_a]
+    return [x[i] / (demands[i] * (1 + population[i])) for i in range(5)]
+
+
+def get_derivatives(x, arrival_rate, demands):
+    f = get_flows(x, demands)
+    return [arrival_rate - f[0], f[0] - f[1], f[1] - f[2], f[2] - f[3], f[3] - f[4]]
+
+
+def get_jacobian(x, demands):
+    # d flows / d x: a class flow grows with its own population and shrinks with the population of its node
+    population = np.array(get_populations(x))[NODES]
+    rate = 1 / (np.array(demands) * (1 + population))
+    same_node = np.equal.outer(NODES, NODES)
+    return np.diag(rate) - same_node * (np.asarray(x) * rate / (1 + population))[:, None]
+
+
+def implicit_step(x, arrival_rate, demands, h):
+    # backward Euler, x' = x + h F(x') solved by Newton from x. The flows decay at rates up to 1 / min(demands),
+    # which an explicit step of h = 1 does not resolve; the implicit one is stable for any h, and its fixed
+    # points are exactly the zeros of F, the steady state
+    x = np.asarray(x, dtype=float)
+    y = x.copy()
+    for _ in range(NEWTON):
+        residual = y - x - h * (ARRIVAL * arrival_rate + ROUTING @ get_flows(y, demands))
+        delta = np.linalg.solve(np.eye(5) - h * ROUTING @ get_jacobian(y, demands), residual)
+        y -= delta
+        if np.abs(delta).max() < TOLERANCE:
+            break
+    return np.maximum(y, 0.0)
+
+
+def model(arrival_rate, writer, auth, b_improvement=False, stop=STOP, camp_interval=CAMP_INTERVAL):
+    demands = get_demands(auth, b_improvement)
+    x = [0.0] * 5  # fluid population of each class at its node
+    completions = [0.0] * 5  # integrated flows
+    response = [0.0] * 5  # integrated flows weighted by the per-visit response time d_c (1 + N)
+
+    current = START
+    camp = camp_interval
+    while current < stop or sum(x) > EMPTY:
+        rate = arrival_rate if current < stop else 0.0
+        x = implicit_step(x, rate, demands, STEP)
+        current += STEP
+
+        f = get_flows(x, demands)
+        population_a, population_b, population_p = get_populations(x)
+        population = [population_a, population_b, population_a, population_p, population_a]
+        for i in range(5):
+            completions[i] += f[i] * STEP
+            response[i] += f[i] * demands[i] * (1 + population[i]) * STEP
+
+        if current >= camp:
+            # cumulative averages since time zero, with the same columns as the WebAppConvDES samples
+            completions_a = completions[0] + completions[2] + completions[4]
+            avg_service_a = (response[0] + response[2] + response[4]) / completions_a if completions_a > 0 else 0.0
+            avg_service_b = response[1] / completions[1] if completions[1] > 0 else 0.0
+            avg_service_p = response[3] / completions[3] if completions[3] > 0 else 0.0
+            writer.writerow((camp, avg_service_a, avg_service_b, avg_service_p,
+                             3 * avg_service_a + avg_service_b + avg_service_p,
+                             population_a, population_b, population_p))
+            camp += camp_interval
+
+
+def get_growth_rates(arrival_rate, auth, b_improvement=False, horizon=STOP):
+    # backlog growth of A, B and P over the last tenth of the horizon (zero below saturation)
+    demands = get_demands(auth, b_improvement)
+    steps = round(horizon / STEP)
+    window = max(steps // 10, 1)
+    x = [0.0] * 5
+    before = get_populations(x)
+    for step in range(steps):
+        if step == steps - window:
+            before = get_populations(x)
+        x = implicit_step(x, arrival_rate, demands, STEP)
+    after = get_populations(x)
+    return [(after[i] - before[i]) / (window * STEP) for i in range(3)]
+
+
+def get_steady_state(arrival_rate, auth, b_improvement=False, horizon=STOP):
+    # populations once the derivatives vanish, and the mean response time of a visit to A, B and P there
+    demands = get_demands(auth, b_improvement)
+    x = [0.0] * 5
+    current = START
+    while current < horizon:
+        x = implicit_step(x, arrival_rate, demands, STEP)
+        current += STEP
+        if np.abs(get_derivatives(x, arrival_rate, demands)).max() < STEADY:
+            break
+    f = get_flows(x, demands)
+    population_a, population_b, population_p = get_populations(x)
+    population = [population_a, population_b, population_a, population_p, population_a]
+    response = [f[i] * demands[i] * (1 + population[i]) for i in range(5)]
+    avg_service_a = (response[0] + response[2] + response[4]) / (f[0] + f[2] + f[4])
+    return [avg_service_a, response[1] / f[1], response[3] / f[3], population_a, population_b, population_p]
+
+
+def validate_steady_state(arrival_rates=(0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2), tolerance=1e-6):
+    # the steady state of the fluid model against WebAppMVA, which it must match below saturation; returns the
+    # metrics off by more than the relative tolerance
+    mismatches = []
+    total = 0
+    for auth, b_improvement in [(1, False), (2, False), (1, True)]:
+        for arrival_rate in arrival_rates:
+            if arrival_rate >= 0.95 * get_saturation_rate(auth, b_improvement):
+                continue
+            expected = mva_model(arrival_rate, auth, b_improvement=b_improvement)
+            expected = [expected[1], expected[6], expected[11], expected[2], expected[7], expected[12]]
+            for metric, value, analytic in zip(['avg_service_a', 'avg_service_b', 'avg_service_p', 'population_a',
+                                                'population_b', 'population_p'],
+                                               get_steady_state(arrival_rate, auth, b_improvement), expected):
+                total += 1
+                if abs(value - analytic) > tolerance * analytic:
+                    mismatches.append((auth, b_improvement, arrival_rate, metric, value, analytic))
+
+    print(f"Validation of the fluid steady state: {total - len(mismatches)}/{total} metrics match the MVA")
+    for mismatch in mismatches:
+        print("    auth {}, b improvement {}, arrival_rate {}: {} = {:.6f}, analytic {:.6f}".format(*mismatch))
+    return mismatches
+
+
+def obj_1_2_fluid_simulation():
+    start = datetime.now()
+    auth_types = [1, 2]
+    arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+    print("Start Fluid Simulation")
+    for auth in auth_types:
+        for b_improvement in [True, False]:
+            for arrival_rate in arrival_rates:
+                with open(f'conv/data_fluid_{arrival_rate}_{auth}_{b_improvement}_conv.csv', 'w',
+                          newline='') as csvfile:
+                    fieldnames = ['time', 'avg_service_a', 'avg_service_b', 'avg_service_p', 'avg_service',
+                                  'population_a', 'population_b', 'population_p']
+                    writer = csv.writer(csvfile)
+                    writer.writerow(fieldnames)
+                    growth_a, growth_b, growth_p = get_growth_rates(arrival_rate, auth, b_improvement)
+                    print(f"Fluid: arrival_rate {arrival_rate},  auth type {auth}, b improvement {b_improvement}, "
+                          f"backlog growth A {growth_a:.4f}, B {growth_b:.4f}, P {growth_p:.4f} jobs/s")
+                    model(arrival_rate, writer, auth, b_improvement)
+
+    end = datetime.now()
+
+    print(f"Fluid Simulation time: {end - start}\n")
+
+
+def main():
+    start = datetime.now()
+
+    validate_steady_state()
+    obj_1_2_fluid_simulation()
+
+    end = datetime.now()
+    print(f"Total Simulation time: {end - start}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+
+from rngs import plant_seeds, select_stream
+from rvgs import exponential
+from WebAppDES import B, K, JobType, Job, Server, get_avg_demand, get_batch_means
+
+START = 0.0  # initial time
+INFINITY = float('inf')
+
+# derivatives are taken with respect to the arrival rate and to a scale factor of each class demand,
+# evaluated at scale 1; the demand of a class is at the index of its job type value
+PARAMETERS = ['arrival_rate', 'demand_a1', 'demand_a2', 'demand_a3', 'demand_b', 'demand_p']
+CLASSES = [JobType.A1, JobType.A2, JobType.A3, JobType.B, JobType.P]  # the terms of avg_response_time
+
+SPEEDUP = 0.5  # demand scale of a sped up node, as b_improvement does for B
+NODES = {'A': [JobType.A1, JobType.A2, JobType.A3], 'B': [JobType.B], 'P': [JobType.P]}
+
+
+class GradientJob(Job):
+    def __init__(self, arrival, d_arrival, job_type, batch, auth=1, b_improvement=False):
+        super().__init__(arrival, job_type, auth, b_improvement)
+        self.batch = batch  # batch of the request the job belongs to
+        self.d_arrival = d_arrival  # derivative of the arrival time at the node
+        self.d_service = np.zeros(len(PARAMETERS))
+        self.d_service[job_type.value] = self.remaining  # a scaled demand moves with its own value
+        self.d_base = None  # d_service plus the derivative of the node attained service at the arrival
+
+
+class GradientServer(Server):
+    # a PS node serves every job present at the same rate, so the remaining work of a job is its demand minus
+    # the attained service of the node since its arrival, and one derivative vector per node is enough
+    def __init__(self):
+        super().__init__()
+        self.d_last_event = np.zeros(len(PARAMETERS))  # derivative of the time of the last event
+        self.d_attained = np.zeros(len(PARAMETERS))  # derivative of the attained service per job
+
+    def advance(self, d_time, number):
+        if number > 0:
+            self.d_attained = self.d_attained + (d_time - self.d_last_event) / number
+        self.d_last_event = d_time
+
+    def process_arrival(self, new_job):
+        self.advance(new_job.d_arrival, self.number)
+        new_job.d_base = new_job.d_service + self.d_attained
+        super().process_arrival(new_job)
+
+    def process_completion(self, completion_time):
+        completed_job = super().process_completion(completion_time)
+        # the completion was scheduled at the last event as its time plus the smallest remaining work times number
+        number = self.number + 1
+        d_time = self.d_last_event + number * (completed_job.d_base - self.d_attained)
+        self.advance(d_time, number)
+        completed_job.d_completion = d_time
+        return completed_job
+
+
+class GradientStats:
+    # sums of the response times and of their derivatives for each term of avg_response_time over the jobs of
+    # the requests of a batch, and the likelihood ratio score of every random variate drawn for them
+    def __init__(self):
+        self.requests = 0  # requests of the batch still in the network
+        self.index = np.zeros(len(CLASSES))
+        self.service = np.zeros(len(CLASSES))
+        self.d_service = np.zeros((len(CLASSES), len(PARAMETERS)))
+        self.score = np.zeros(len(PARAMETERS))
+
+    def update_service(self, completed_job, completion_time):
+        c = CLASSES.index(completed_job.job_type)
+        self.index[c] += 1
+        self.service[c] += completion_time - completed_job.arrival
+        self.d_service[c] += completed_job.d_completion - completed_job.d_arrival
+
+    def update_score(self, parameter, value, mean):
+        # d log f / d parameter of an exponential variate: 1 / rate - x for the arrival rate and
+        # x / mean - 1 for a demand scale
+        if parameter == 0:
+            self.score[0] += mean - value
+        else:
+            self.score[parameter] += value / mean - 1
+
+    def get_observation(self):
+        index = np.maximum(self.index, 1)
+        avg_response_time = (self.service / index).sum()
+        gradient = (self.d_service / index[:, None]).sum(axis=0)
+        return avg_response_time, gradient, self.score
+
+
+def get_job(arrival, d_arrival, job_type, batch, batches, auth, b_improvement):
+    job = GradientJob(arrival, d_arrival, job_type, batch, auth, b_improvement)
+    batches[batch].update_score(job_type.value, job.remaining, get_avg_demand(job_type, auth, b_improvement))
+    return job
+
+
+def model(arrival_rate, auth, b=B, k=K, b_improvement=False):
+    # batch means of avg_response_time and of its IPA and likelihood ratio derivatives. A batch holds the jobs
+    # of b consecutive requests and closes when the last of them leaves: a batch of b arrivals would move
+    # completions across its edges under a perturbation, a jump that IPA does not see. The likelihood ratio
+    # scores only the variates of the batch, so it ignores the work carried over from the previous one
+    server_a = GradientServer()
+    server_b = GradientServer()
+    server_p = GradientServer()
+    batches = {0: GradientStats()}
+
+    current = START
+    select_stream(0)
+    interarrival = exponential(1.0 / arrival_rate)
+    batches[0].update_score(0, interarrival, 1.0 / arrival_rate)
+    arrival_temp = START + interarrival
+    arrival_a = arrival_temp
+    completion_a = completion_b = completion_p = INFINITY
+    d_zero = np.zeros(len(PARAMETERS))
+
+    arrivals_a1 = 0  # requests entered so far
+    observations = []
+
+    while len(observations) < k:
+        current = min(arrival_a, completion_a, completion_b, completion_p)
+        completed_job = None
+
+        # arrival_a1
+        if current == arrival_a:
+            batch = arrivals_a1 // b
+            batches[batch].requests += 1
+            d_arrival = d_zero.copy()
+            d_arrival[0] = -current / arrival_rate  # every interarrival time is proportional to 1 / arrival_rate
+            server_a.process_arrival(get_job(current, d_arrival, JobType.A1, batch, batches, auth, b_improvement))
+            arrivals_a1 += 1
+
+            next_batch = arrivals_a1 // b
+            batches.setdefault(next_batch, GradientStats())
+            select_stream(0)
+            interarrival = exponential(1.0 / arrival_rate)
+            batches[next_batch].update_score(0, interarrival, 1.0 / arrival_rate)
+            arrival_temp += interarrival
+            arrival_a = arrival_temp
+            completion_a = current + server_a.get_next_complete_process_time()
+
+        # completion_a
+        elif current == completion_a:
+            completed_job = server_a.process_completion(completion_a)
+
+            if completed_job.job_type == JobType.A1:
+                server_b.process_arrival(get_job(current, completed_job.d_completion, JobType.B, completed_job.batch,
+                                                 batches, auth, b_improvement))
+                completion_b = current + server_b.get_next_complete_process_time()
+            elif completed_job.job_type == JobType.A2:
+                server_p.process_arrival(get_job(current, completed_job.d_completion, JobType.P, completed_job.batch,
+                                                 batches, auth, b_improvement))
+                completion_p = current + server_p.get_next_complete_process_time()
+
+            if server_a.number > 0:
+                completion_a = current + server_a.get_next_complete_process_time()
+            else:
+                completion_a = INFINITY
+
+        # completion_b
+        elif current == completion_b:
+            completed_job = server_b.process_completion(completion_b)
+            server_a.process_arrival(get_job(current, completed_job.d_completion, JobType.A2, completed_job.batch,
+                                             batches, auth, b_improvement))
+            completion_a = current + server_a.get_next_complete_process_time()
+
+            if server_b.number > 0:
+                completion_b = current + server_b.get_next_complete_process_time()
+            else:
+                completion_b = INFINITY
+
+        # completion_p
+        elif current == completion_p:
+            completed_job = server_p.process_completion(completion_p)
+            server_a.process_arrival(get_job(current, completed_job.d_completion, JobType.A3, completed_job.batch,
+                                             batches, auth, b_improvement))
+            completion_a = current + server_a.get_next_complete_process_time()
+
+            if server_p.number > 0:
+                completion_p = current + server_p.get_next_complete_process_time()
+            else:
+                completion_p = INFINITY
+
+        if completed_job is not None:
+            stats = batches[completed_job.batch]
+            stats.update_service(completed_job, current)
+            if completed_job.job_type == JobType.A3:
+                stats.requests -= 1
+            # batches close in order, once all b requests have entered and left
+            while len(observations) < k and arrivals_a1 >= (len(observations) + 1) * b and \
+                    batches[len(observations)].requests == 0:
+                observations.append(batches.pop(len(observations)).get_observation())
+
+    avg_response_time = np.array([observation[0] for observation in observations])
+    ipa = np.array([observation[1] for observation in observations])
+    # centring the response time makes the estimator a covariance with the score, whose mean is zero
+    lr = (avg_response_time - avg_response_time.mean())[:, None] * np.array([observation[2]
+                                                                             for observation in observations])
+    means = [[float(r)] + [float(g) for g in ipa[i]] + [float(g) for g in lr[i]]
+             for i, r in enumerate(avg_response_time)]
+    return get_batch_means(means)
+
+
+def get_gradient(data):
+    # per parameter, the estimator with the narrower ci: IPA follows the sample path exactly, but the
+    # A-B-A-P-A feedback makes that path very sensitive once the nodes stay busy, and its variance explodes
+    gradient = []
+    for i in range(len(PARAMETERS)):
+        ipa = 2 + 2 * i
+        lr = ipa + 2 * len(PARAMETERS)
+        gradient.append(data[ipa] if data[ipa + 1] <= data[lr + 1] else data[lr])
+    return gradient
+
+
+def get_candidates(gradient, auth, b_improvement=False):
+    # first order change of avg_response_time for each speed-up candidate: a node twice as fast (as
+    # b_improvement does for B) and the switch to the other auth type; the error grows with the step
+    candidates = {}
+    for node, job_types in NODES.items():
+        candidates[node] = sum(gradient[job_type.value] * (SPEEDUP - 1) for job_type in job_types)
+    other = 2 if auth == 1 else 1
+    candidates['auth'] = sum(gradient[job_type.value] * (get_avg_demand(job_type, other, b_improvement) /
+                                                         get_avg_demand(job_type, auth, b_improvement) - 1)
+                             for job_type in JobType)
+    return candidates
+
+
+def obj_gradient_simulation():
+    start = datetime.now()
+    seed = 123456789
+    print("Start Gradient Simulation")
+    with open('data_obj_gradient_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'arrival_rate', 'avg_response_time', 'avg_response_time_ci']
+        for estimator in ['ipa', 'lr']:
+            for parameter in PARAMETERS:
+                fieldnames += [f'{estimator}_{parameter}', f'{estimator}_{parameter}_ci']
+        fieldnames += [f'delta_{candidate}' for candidate in list(NODES) + ['auth']]
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        auth_types = [1, 2]
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+        for auth in auth_types:
+            for arrival_rate in arrival_rates:
+                plant_seeds(seed)
+                data = model(arrival_rate, auth, B, K)
+                gradient = get_gradient(data)
+                candidates = get_candidates(gradient, auth)
+                ranking = sorted(candidates, key=candidates.get)
+                print(f"Gradient: arrival_rate {arrival_rate} and auth type {auth}, "
+                      f"d response time / d arrival_rate {gradient[0]:.4f}, speed-up ranking " +
+                      ", ".join(f"{candidate} {candidates[candidate]:+.4f}" for candidate in ranking))
+                writer.writerow([auth, arrival_rate] + data + [candidates[candidate] for candidate in candidates])
+
+    end = datetime.now()
+    print(f"Gradient Simulation time: {end - start}\n")
+
+
+def main():
+    start = datetime.now()
+
+    obj_gradient_simulation()
+
+    end = datetime.now()
+    print(f"Total Simulation time: {end - start}\n")
+
+
+if __name__ == "__main__":
+    main()
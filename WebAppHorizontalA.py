@@ -1,12 +1,12 @@
 import csv
 from datetime import datetime
 from enum import Enum
+from heapq import heappush, heappop
+from math import ceil
 
-import numpy as np
-
-from rngs import select_stream, plant_seeds
-from rvgs import exponential, bernoulli
-from rvms import idfStudent
+from rngs import select_stream, plant_seeds, random
+from rvgs import exponential
+from WebAppDES import BATCH_MEANS_FIELDNAMES, RESPONSE_TIME, get_batch_means
 
 ALPHA = 0.05
 START = 0.0  # initial time
@@ -14,6 +14,24 @@ STOP = 5760000.0  # terminal time
 INFINITY = (100.0 * STOP)  # must be much larger than STOP
 B = 8192
 K = 64
+REPLICAS = (2, 1, 1)  # replicas of the A, B and P tiers
+D = 2  # replicas sampled by power of d choices
+PERCENTILE = 0.95  # tail of the request response time
+SCALING_INTERVAL = 10.0  # time between two scaling decisions
+SCALING_WINDOW = 6  # scaling intervals covered by the metric of a decision
+COOLDOWN = 60.0
+PROVISIONING_DELAY = 30.0
+
+HORIZONTAL_FIELDNAMES = BATCH_MEANS_FIELDNAMES + ['imbalance_a', 'imbalance_a_ci',
+                                                  'imbalance_b', 'imbalance_b_ci',
+                                                  'imbalance_p', 'imbalance_p_ci',
+                                                  'p95_response_time', 'p95_response_time_ci',
+                                                  'replicas_a', 'replicas_a_ci',
+                                                  'replicas_b', 'replicas_b_ci',
+                                                  'replicas_p', 'replicas_p_ci',
+                                                  'replica_seconds', 'replica_seconds_ci']
+P95 = HORIZONTAL_FIELDNAMES.index('p95_response_time')
+COST = HORIZONTAL_FIELDNAMES.index('replica_seconds')
 
 arrivalTemp = START
 
@@ -51,27 +69,32 @@ def get_service(job_type, auth=1):
     return exponential(avg_demand)
 
 
-def round_robin():
-    select_stream(6)
-    return bernoulli(0.5)
+class DispatchPolicy(Enum):
+    ROUND_ROBIN = 1
+    RANDOM = 2  # uniform on stream 6, the coin flip of the two replica model
+    JSQ = 3  # join the shortest queue
+    LEAST_WORK = 4  # join the replica with the least remaining work
+    POWER_OF_D = 5  # join the shortest of d replicas sampled on stream 6
+
+
+class ScalingMetric(Enum):
+    UTILIZATION = 1  # busy fraction of the serving replicas
+    QUEUE = 2  # jobs per serving replica
 
 
 class Time:
     arrival_a = INFINITY  # next arrival time for jobs of type A1
-    arrival_p = INFINITY
-    completion_a1 = INFINITY  # next completion time on server A1
-    completion_a2 = INFINITY  # next completion time on server A2
-    completion_b = INFINITY  # next completion time on server B
-    completion_p = INFINITY  # next completion time on server P
     current = INFINITY  # current time
     next = INFINITY  # next (most imminent) event time
     last = INFINITY  # last arrival_a time
+    camp = INFINITY  # next scaling decision
 
 
 class Track:
     def __init__(self):
         self.node = 0.0  # time integrated number in the node
         self.service = 0.0  # time integrated number in service
+        self.last = START  # time of the last integration
 
     def update(self, current_time, next_time, number):
         self.node += (next_time - current_time) * number
@@ -86,11 +109,17 @@ class JobType(Enum):
     P = 5
 
 
+TIERS = {JobType.A1: 0, JobType.A2: 0, JobType.A3: 0, JobType.B: 1, JobType.P: 2}  # tier of each job type
+ROUTING = {JobType.A1: JobType.B, JobType.A2: JobType.P, JobType.B: JobType.A2, JobType.P: JobType.A3}
+
+
 class Job:
-    def __init__(self, arrival, job_type, auth=1):
+    def __init__(self, arrival, job_type, auth=1, start=None, replica=0):
         self.arrival = arrival
         self.remaining = get_service(job_type, auth)
         self.job_type = job_type
+        self.start = arrival if start is None else start  # arrival of the request
+        self.replica = replica  # A replica the request is pinned to
 
 
 class Server:
@@ -100,6 +129,10 @@ class Server:
         self.index = 0  # used to count departed jobs
         self.area = Track()
         self.last_event = 0
+        self.completion = INFINITY  # next completion time
+        self.drain = START  # time the node empties without further arrivals
+        self.active = True  # open to dispatch
+        self.draining = False  # scaled in with jobs left
 
         # interarrival
         self.arrivals = 0
@@ -118,27 +151,34 @@ class Server:
     def get_next_complete_process_time(self):
         return self.get_min_remaining_process_time() * self.number
 
+    def update_area(self, current_time):
+        if self.number > 0:
+            self.area.update(self.area.last, current_time, self.number)
+        self.area.last = current_time
+
     def reset_stats(self, current_time):
         self.index = 0
         self.area.node = 0
         self.area.service = 0
-        self.last_event = current_time
+        self.area.last = current_time
 
         self.avg_interarrival = 0
         self.arrivals = 0
         self.interarrival_variance = 0
-        self.last_arrival = 0
+        self.last_arrival = current_time
 
         self.avg_service = 0
         self.service_variance = 0
 
     def process_arrival(self, new_job):
+        self.update_area(new_job.arrival)
         if self.number > 0:
             processed_time = (new_job.arrival - self.last_event) / self.number
             for job in self.jobs:
                 job.remaining -= processed_time
                 job.last_event = job.arrival
         self.last_event = new_job.arrival
+        self.drain = max(self.drain, new_job.arrival) + new_job.remaining  # the node serves work at rate 1
 
         self.arrivals += 1
         d = new_job.arrival - self.last_arrival - self.avg_interarrival
@@ -150,6 +190,7 @@ class Server:
         self.number += 1
 
     def process_completion(self, completion_time):
+        self.update_area(completion_time)
         if self.number > 0:
             processed_time = (completion_time - self.last_event) / self.number
             for job in self.jobs:
@@ -169,201 +210,356 @@ class Server:
         return completed_job
 
 
-def model(arrival_rate, auth, b=0, k=0):
+class Autoscaler:
+    # target tracking with a dead band: when the windowed metric of a tier leaves [low, high], the tier is
+    # resized to the number of replicas that would bring it back to the middle of the band
+    def __init__(self, metric=ScalingMetric.UTILIZATION, low=0.5, high=0.8, min_replicas=1, max_replicas=64,
+                 cooldown=COOLDOWN, delay=PROVISIONING_DELAY, window=SCALING_WINDOW):
+        self.metric = metric
+        self.low = low
+        self.high = high
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.cooldown = cooldown  # time after a scaling action during which the tier is left alone
+        self.delay = delay  # time from the launch of a replica to its first dispatch
+        self.window = window  # scaling intervals covered by the metric
+
+    def get_replicas(self, value, replicas):
+        if self.low <= value <= self.high:
+            return replicas
+        target = (self.low + self.high) / 2
+        return min(max(ceil(replicas * value / target), self.min_replicas), self.max_replicas)
+
+
+class Tier:
+    # replicas of a node behind a dispatcher. JSQ keeps the replicas in buckets by number in the node, which
+    # changes by one per event, so the shortest bucket is found in O(1); least work keeps a heap of the drain
+    # times, which change only at arrivals, with stale entries dropped when they reach the top. A replica
+    # taken out by scale in leaves the dispatch structures at once and keeps serving its jobs until it is empty
+    def __init__(self, replicas, policy=DispatchPolicy.RANDOM, d=D, autoscaler=None):
+        self.servers = [Server() for _ in range(replicas)]
+        self.active = list(range(replicas))  # replicas open to dispatch
+        self.retired = []  # idle replicas out of the tier, reused first on scale out
+        self.draining = 0  # replicas out of dispatch with jobs left
+        self.provisioning = 0  # replicas launched and not yet dispatched to
+        self.policy = policy
+        self.d = d
+        self.next = 0  # next position of round robin in the active replicas
+        self.buckets = [dict.fromkeys(range(replicas))]  # active replicas by number in the node, in arrival order
+        self.shortest = 0  # lowest non empty bucket
+        self.work = [(START, i) for i in range(replicas)]  # heap of (drain time, replica)
+
+        # cumulative areas since the start of the run, for the scaling windows and the cost
+        self.number = 0  # number in the tier
+        self.busy = 0  # replicas with jobs
+        self.area = Track()
+        self.capacity = 0.0  # time integrated number of serving replicas
+        self.cost = 0.0  # time integrated number of launched replicas, in replica-seconds
+        self.batch_capacity = 0.0
+        self.batch_cost = 0.0
+
+        self.autoscaler = autoscaler
+        if autoscaler is not None:
+            self.samples = [(START, 0.0, 0.0, 0.0)] * (autoscaler.window + 1)  # ring buffer of area snapshots
+            self.head = 0
+            self.last_action = -INFINITY
+
+        # interarrival
+        self.arrivals = 0
+        self.last_arrival = 0
+        self.avg_interarrival = 0
+
+    def dispatch(self):
+        replicas = len(self.active)
+        if replicas == 1:
+            return self.active[0]
+        if self.policy == DispatchPolicy.ROUND_ROBIN:
+            self.next %= replicas
+            i = self.active[self.next]
+            self.next += 1
+        elif self.policy == DispatchPolicy.RANDOM:
+            select_stream(6)
+            i = self.active[int(random() * replicas)]
+        elif self.policy == DispatchPolicy.JSQ:
+            i = next(iter(self.buckets[self.shortest]))
+        elif self.policy == DispatchPolicy.LEAST_WORK:
+            while not self.servers[self.work[0][1]].active or \
+                    self.work[0][0] != self.servers[self.work[0][1]].drain:
+                heappop(self.work)
+            i = self.work[0][1]
+        else:
+            select_stream(6)
+            sampled = []
+            while len(sampled) < min(self.d, replicas):
+                j = self.active[int(random() * replicas)]
+                if j not in sampled:
+                    sampled.append(j)
+            i = min(sampled, key=lambda j: self.servers[j].number)
+        return i
+
+    def move(self, i, old, new):
+        del self.buckets[old][i]
+        if new == len(self.buckets):
+            self.buckets.append({})
+        self.buckets[new][i] = None
+        if new < self.shortest or not self.buckets[self.shortest]:
+            self.shortest = new
+
+    def update_area(self, current_time):
+        serving = len(self.active) + self.draining
+        self.area.node += (current_time - self.area.last) * self.number
+        self.area.service += (current_time - self.area.last) * self.busy
+        self.capacity += (current_time - self.area.last) * serving
+        self.cost += (current_time - self.area.last) * (serving + self.provisioning)
+        self.area.last = current_time
+
+    def process_arrival(self, i, new_job):
+        server = self.servers[i]
+        self.update_area(new_job.arrival)
+        self.number += 1
+        if server.number == 0:
+            self.busy += 1
+        if self.policy == DispatchPolicy.JSQ and server.active:
+            self.move(i, server.number, server.number + 1)
+        server.process_arrival(new_job)
+        if self.policy == DispatchPolicy.LEAST_WORK and server.active:
+            heappush(self.work, (server.drain, i))
+
+        self.arrivals += 1
+        self.avg_interarrival += (new_job.arrival - self.last_arrival - self.avg_interarrival) / self.arrivals
+        self.last_arrival = new_job.arrival
+
+    def process_completion(self, i, completion_time):
+        server = self.servers[i]
+        self.update_area(completion_time)
+        self.number -= 1
+        if server.number == 1:
+            self.busy -= 1
+        completed_job = server.process_completion(completion_time)
+        if self.policy == DispatchPolicy.JSQ and server.active:
+            self.move(i, server.number + 1, server.number)
+        if server.draining and server.number == 0:
+            self.retire(i)
+        return completed_job
+
+    def schedule(self, i, current_time, completions, tier):
+        # every event at a replica moves its completion, earlier as well as later under PS, and pushes a new entry
+        # in the event heap without removing the old one. An entry is valid only while its time equals the
+        # current completion of its replica; the loop drops the others when they reach the top of the heap
+        server = self.servers[i]
+        if server.number > 0:
+            server.completion = current_time + server.get_next_complete_process_time()
+            heappush(completions, (server.completion, tier, i))
+        else:
+            server.completion = INFINITY
+
+    def autoscale(self, current_time, provisions, tier):
+        self.update_area(current_time)
+        size = len(self.samples)
+        self.head = (self.head + 1) % size
+        oldest = self.samples[(self.head + 1) % size]
+        self.samples[self.head] = (current_time, self.area.node, self.area.service, self.capacity)
+        capacity = self.capacity - oldest[3]
+        if capacity <= 0 or current_time - self.last_action < self.autoscaler.cooldown:
+            return
+        if self.autoscaler.metric == ScalingMetric.UTILIZATION:
+            value = (self.area.service - oldest[2]) / capacity
+        else:
+            value = (self.area.node - oldest[1]) / capacity  # jobs per replica
+
+        replicas = self.autoscaler.get_replicas(value, len(self.active))
+        if replicas > len(self.active) + self.provisioning:
+            for _ in range(replicas - len(self.active) - self.provisioning):
+                self.provisioning += 1
+                heappush(provisions, (current_time + self.autoscaler.delay, tier))
+        elif replicas < len(self.active) and self.provisioning == 0:
+            for _ in range(len(self.active) - replicas):
+                self.deactivate(min(self.active, key=lambda j: self.servers[j].number))
+        else:
+            return
+        self.last_action = current_time
+
+    def activate(self, current_time):
+        # a provisioned replica joins the tier, on a retired one when there is any
+        self.update_area(current_time)
+        self.provisioning -= 1
+        if self.retired:
+            i = self.retired.pop()
+        else:
+            i = len(self.servers)
+            self.servers.append(Server())
+            self.servers[i].reset_stats(current_time)
+        server = self.servers[i]
+        server.active = True
+        self.active.append(i)
+        if self.policy == DispatchPolicy.JSQ:
+            self.buckets[0][i] = None
+            self.shortest = 0
+        elif self.policy == DispatchPolicy.LEAST_WORK:
+            heappush(self.work, (server.drain, i))
+
+    def deactivate(self, i):
+        # scale in: the replica stops receiving jobs and drains the ones it has
+        server = self.servers[i]
+        self.active.remove(i)
+        server.active = False
+        if self.policy == DispatchPolicy.JSQ:
+            del self.buckets[server.number][i]
+            while not self.buckets[self.shortest]:
+                self.shortest += 1
+        if server.number > 0:
+            server.draining = True
+            self.draining += 1
+        else:
+            self.retired.append(i)
+
+    def retire(self, i):
+        self.servers[i].draining = False
+        self.draining -= 1
+        self.retired.append(i)
+
+    def reset_stats(self, current_time):
+        for server in self.servers:
+            server.reset_stats(current_time)
+        self.update_area(current_time)
+        self.batch_capacity = self.capacity
+        self.batch_cost = self.cost
+        self.arrivals = 0
+        self.avg_interarrival = 0
+        self.last_arrival = current_time
+
+
+def get_percentile(values, q=PERCENTILE):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def model(arrival_rate, auth, b=0, k=0, replicas=REPLICAS, policy=DispatchPolicy.RANDOM, d=D, affinity=False,
+          autoscalers=(None, None, None), scaling_interval=SCALING_INTERVAL):
+    # replicas gives the initial size of the A, B and P tiers, each dispatching its visits with policy and resized
+    # every scaling_interval by its autoscaler, if any. Completions of every replica share one event heap, so an
+    # event costs O(log N) in the number of replicas N. With affinity the A2 and A3 visits of a request are pinned
+    # to the A replica of its A1 visit (sticky sessions), and move to another one if that replica is scaled in
     global arrivalTemp
     arrivalTemp = START
     batch_enabled = b != 0 and k != 0
+    stop = INFINITY if batch_enabled else STOP  # batches run on a continuous clock until k are collected
 
-    server_a1 = Server()
-    server_a2 = Server()
-    server_b = Server()
-    server_p = Server()
+    tiers = [Tier(n, policy, d, autoscaler) for n, autoscaler in zip(replicas, autoscalers)]
+    completions = []  # heap of (completion time, tier, replica)
+    provisions = []  # heap of (activation time, tier)
 
     t = Time()
 
     t.current = START  # set the clock
     t.arrival_a = get_arrival(arrival_rate)  # schedule the first arrival_a
+    if any(autoscaler is not None for autoscaler in autoscalers):
+        t.camp = scaling_interval
 
     a_arrivals = 0  # batch measure index
+    requests = 0  # requests in the network
+    response_times = []  # of the requests completed in the batch
     means = []
+    batch_start = START  # epoch of the current batch
 
-    while t.arrival_a < STOP or server_a1.number > 0 or server_a2.number > 0 or server_b.number > 0 or server_p.number > 0:
-
-        t.next = min(t.arrival_a, t.completion_a1, t.completion_a2, t.completion_b, t.completion_p)  # next event time
+    while t.arrival_a < stop or requests > 0:
 
-        # update integrals
-        if server_a1.number > 0:
-            server_a1.area.update(t.current, t.next, server_a1.number)
-        if server_a2.number > 0:
-            server_a2.area.update(t.current, t.next, server_a2.number)
-        if server_b.number > 0:
-            server_b.area.update(t.current, t.next, server_b.number)
-        if server_p.number > 0:
-            server_p.area.update(t.current, t.next, server_p.number)
+        while completions and completions[0][0] != tiers[completions[0][1]].servers[completions[0][2]].completion:
+            heappop(completions)
+        t.next = min(t.arrival_a, completions[0][0] if completions else INFINITY, t.camp,
+                     provisions[0][0] if provisions else INFINITY)  # next event time
 
         t.current = t.next  # advance the clock
 
         # arrival_a
         if t.current == t.arrival_a:
-            if round_robin() == 1:
-                server_a1.process_arrival(Job(t.current, JobType.A1))
-                t.completion_a1 = t.current + server_a1.get_next_complete_process_time()
-            else:
-                server_a2.process_arrival(Job(t.current, JobType.A1))
-                t.completion_a2 = t.current + server_a2.get_next_complete_process_time()
+            i = tiers[0].dispatch()
+            tiers[0].process_arrival(i, Job(t.current, JobType.A1, replica=i))
+            tiers[0].schedule(i, t.current, completions, 0)
 
             t.arrival_a = get_arrival(arrival_rate)
-            if t.arrival_a > STOP:
+            if t.arrival_a > stop:
                 t.last = t.current
                 t.arrival_a = INFINITY
 
             a_arrivals += 1
-
-
-        # completion_a1
-        elif t.current == t.completion_a1:
-            completed_job = server_a1.process_completion(t.current)
-
-            if completed_job.job_type == JobType.A1:
-                server_b.process_arrival(Job(t.current, JobType.B))
-                t.completion_b = t.current + server_b.get_next_complete_process_time()
-            elif completed_job.job_type == JobType.A2:
-                server_p.process_arrival(Job(t.current, JobType.P, auth))
-                t.completion_p = t.current + server_p.get_next_complete_process_time()
-
-            if server_a1.number > 0:
-                t.completion_a1 = t.current + server_a1.get_next_complete_process_time()
+            requests += 1
+
+        # completion on a replica
+        elif completions and t.current == completions[0][0]:
+            _, tier, i = heappop(completions)
+            completed_job = tiers[tier].process_completion(i, t.current)
+            tiers[tier].schedule(i, t.current, completions, tier)
+
+            if completed_job.job_type in ROUTING:
+                job_type = ROUTING[completed_job.job_type]
+                tier = TIERS[job_type]
+                if affinity and tier == 0 and tiers[0].servers[completed_job.replica].active:
+                    i = completed_job.replica
+                else:
+                    i = tiers[tier].dispatch()
+                replica = i if tier == 0 else completed_job.replica
+                tiers[tier].process_arrival(i, Job(t.current, job_type, auth, completed_job.start, replica))
+                tiers[tier].schedule(i, t.current, completions, tier)
             else:
-                t.completion_a1 = INFINITY
-
-        # completion_a1
-        elif t.current == t.completion_a2:
-            completed_job = server_a2.process_completion(t.current)
+                requests -= 1
+                response_times.append(t.current - completed_job.start)
 
-            if completed_job.job_type == JobType.A1:
-                server_b.process_arrival(Job(t.current, JobType.B))
-                t.completion_b = t.current + server_b.get_next_complete_process_time()
-            elif completed_job.job_type == JobType.A2:
-                server_p.process_arrival(Job(t.current, JobType.P, auth))
-                t.completion_p = t.current + server_p.get_next_complete_process_time()
-
-            if server_a2.number > 0:
-                t.completion_a2 = t.current + server_a2.get_next_complete_process_time()
-            else:
-                t.completion_a2 = INFINITY
-
-        # completion_b
-        elif t.current == t.completion_b:
-            server_b.process_completion(t.completion_b)
-            if round_robin():
-                server_a1.process_arrival(Job(t.current, JobType.A2))
-                t.completion_a1 = t.current + server_a1.get_next_complete_process_time()
-            else:
-                server_a2.process_arrival(Job(t.current, JobType.A2))
-                t.completion_a2 = t.current + server_a2.get_next_complete_process_time()
-
-            if server_b.number > 0:
-                t.completion_b = t.current + server_b.get_next_complete_process_time()
-            else:
-                t.completion_b = INFINITY
-
-        # completion_p
-        elif t.current == t.completion_p:
-            server_p.process_completion(t.completion_p)
-
-            if round_robin():
-                server_a1.process_arrival(Job(t.current, JobType.A3, auth))
-                t.completion_a1 = t.current + server_a1.get_next_complete_process_time()
-            else:
-                server_a2.process_arrival(Job(t.current, JobType.A3, auth))
-                t.completion_a2 = t.current + server_a2.get_next_complete_process_time()
+        # scaling decisions
+        elif t.current == t.camp:
+            for tier in range(len(tiers)):
+                if tiers[tier].autoscaler is not None:
+                    tiers[tier].autoscale(t.current, provisions, tier)
+            t.camp += scaling_interval
 
-            if server_p.number > 0:
-                t.completion_p = t.current + server_p.get_next_complete_process_time()
-            else:
-                t.completion_p = INFINITY
+        # a provisioned replica is ready
+        else:
+            _, tier = heappop(provisions)
+            tiers[tier].activate(t.current)
 
         if batch_enabled and a_arrivals == b:
-            (avg_population, avg_population_a1, avg_population_a2, avg_population_b, avg_population_p,
-             avg_response_time, utilization_a1,
-             utilization_a2, utilization_b, utilization_p) = (
-                get_simulation_statistics(server_a1, server_a2, server_b, server_p, t.current))
-
-            means.append(
-                [server_a1.avg_interarrival, server_a1.avg_service, avg_population_a1, utilization_a1, server_a1.index,
-                 server_a2.avg_interarrival, server_a2.avg_service, avg_population_a2, utilization_a2, server_a2.index,
-                 server_b.avg_interarrival, server_b.avg_service, avg_population_b, utilization_b, server_b.index,
-                 server_p.avg_interarrival, server_p.avg_service, avg_population_p, utilization_p, server_p.index,
-                 avg_response_time, avg_population])
-
-            t.completion_a1 -= t.current
-            t.completion_a2 -= t.current
-            t.completion_b -= t.current
-            t.completion_p -= t.current
-            t.arrival_a -= t.current
-            t.current = START
-            arrivalTemp = START
-            a_arrivals = 0
+            means.append(get_simulation_statistics(tiers, response_times, t.current, batch_start))
 
-            server_a1.reset_stats(t.current)
-            server_a2.reset_stats(t.current)
-            server_b.reset_stats(t.current)
-            server_p.reset_stats(t.current)
+            a_arrivals = 0
+            batch_start = t.current
+            response_times = []
 
-            for j in server_a1.jobs:
-                j.arrival = t.current
-            for j in server_a2.jobs:
-                j.arrival = t.current
-            for j in server_b.jobs:
-                j.arrival = t.current
-            for j in server_p.jobs:
-                j.arrival = t.current
+            for tier in tiers:
+                tier.reset_stats(t.current)
 
             if len(means) == k:
-                data = []
-                for i in range(22):
-                    mean = 0
-
-                    for m in means:
-                        mean += m[i]
-                    mean /= k
-                    data.append(mean)
-                    n = 0
-                    for m in means:
-                        n += pow((m[i] - mean), 2)
-                    data.append(idfStudent(k - 1, 1 - ALPHA / 2) * np.sqrt(n / (k - 1)) / np.sqrt(k - 1))
-
-                return data
-
-    (avg_population,
-     avg_population_a1, avg_population_a2, avg_population_b, avg_population_p,
-     avg_response_time,
-     utilization_a1, utilization_a2, utilization_b, utilization_p) = (
-        get_simulation_statistics(server_a1, server_a2, server_b, server_p, t.current))
-
-    return [server_a1.avg_interarrival, server_a1.avg_service, avg_population_a1, utilization_a1, server_a1.index,
-            server_a2.avg_interarrival, server_a2.avg_service, avg_population_a2, utilization_a2, server_a2.index,
-            server_b.avg_interarrival, server_b.avg_service, avg_population_b, utilization_b, server_b.index,
-            server_p.avg_interarrival, server_p.avg_service, avg_population_p, utilization_p, server_p.index,
-            avg_response_time, avg_population]
-
-
-def get_simulation_statistics(server_a1, server_a2, server_b, server_p, current_time):
-    avg_population_a1 = server_a1.area.node / current_time
-    utilization_a1 = server_a1.area.service / current_time
-    avg_population_a2 = server_a2.area.node / current_time
-    utilization_a2 = server_a2.area.service / current_time
-    avg_population_b = server_b.area.node / current_time
-    utilization_b = server_b.area.service / current_time
-    avg_population_p = server_p.area.node / current_time
-    utilization_p = server_p.area.service / current_time
-    avg_response_time = 3 * (
-            server_a1.avg_service + server_a2.avg_service) / 2 + server_b.avg_service + server_p.avg_service
-    avg_population = server_a1.area.node / current_time + server_a2.area.node / current_time + server_b.area.node / current_time + server_p.area.node / current_time
-    return (avg_population,
-            avg_population_a1, avg_population_a2, avg_population_b, avg_population_p,
-            avg_response_time,
-            utilization_a1, utilization_a2, utilization_b, utilization_p)
+                return get_batch_means(means)
+
+    return get_simulation_statistics(tiers, response_times, t.current)
+
+
+def get_simulation_statistics(tiers, response_times, current_time, start_time=START):
+    # per tier the arrivals and visits over all its replicas, with the utilization over the serving replicas.
+    # The imbalance of a tier is the population of its most loaded replica over the mean one, and its cost the
+    # replica-seconds of every launched replica, booting and draining ones included
+    elapsed = current_time - start_time
+    data = []
+    imbalances = []
+    replicas = []
+    for tier in tiers:
+        tier.update_area(current_time)
+        for server in tier.servers:
+            server.update_area(current_time)
+        index = sum(server.index for server in tier.servers)
+        avg_service = sum(server.index * server.avg_service for server in tier.servers) / max(index, 1)
+        avg_population = sum(server.area.node for server in tier.servers) / elapsed
+        capacity = tier.capacity - tier.batch_capacity
+        utilization = sum(server.area.service for server in tier.servers) / capacity
+        data += [tier.avg_interarrival, avg_service, avg_population, utilization, index]
+        peak = max(server.area.node for server in tier.servers) / elapsed
+        imbalances.append(peak * capacity / elapsed / avg_population if avg_population > 0 else 1.0)
+        replicas.append((tier.cost - tier.batch_cost) / elapsed)
+    avg_response_time = 3 * data[1] + data[6] + data[11]  # a request visits A three times
+    avg_population = data[2] + data[7] + data[12]
+    return (data + [avg_response_time, avg_population] + imbalances + [get_percentile(response_times)] +
+            replicas + [sum(replicas) * elapsed])
 
 
 def batch_means_simulation():
@@ -371,29 +567,7 @@ def batch_means_simulation():
     seed = 123456789
     print("Start Batch Means Simulation")
     with open('data_horizontalA_batch_means.csv', 'w', newline='') as csvfile:
-        fieldnames = ['arrival_rate',
-                      'interarrival_a1', 'interarrival_a1_ci',
-                      'avg_service_a1', 'avg_service_a1_ci',
-                      'avg_population_a1', 'avg_population_a1_ci',
-                      'utilization_a1', 'utilization_a1_ci',
-                      'completion_a1', 'completion_a1_ci',
-                      'interarrival_a2', 'interarrival_a2_ci',
-                      'avg_service_a2', 'avg_service_a2_ci',
-                      'avg_population_a2', 'avg_population_a2_ci',
-                      'utilization_a2', 'utilization_a2_ci',
-                      'completion_a2', 'completion_a2_ci',
-                      'interarrival_b', 'interarrival_b_ci',
-                      'avg_service_b', 'avg_service_b_ci',
-                      'avg_population_b', 'avg_population_b_ci',
-                      'utilization_b', 'utilization_b_ci',
-                      'completion_b', 'completion_b_ci',
-                      'interarrival_p', 'interarrival_p_ci',
-                      'avg_service_p', 'avg_service_p_ci',
-                      'avg_population_p', 'avg_population_p_ci',
-                      'utilization_p', 'utilization_p_ci',
-                      'completion_p', 'completion_p_ci',
-                      'avg_response_time', 'avg_response_time_ci',
-                      'avg_population', 'avg_population_ci']
+        fieldnames = ['arrival_rate'] + HORIZONTAL_FIELDNAMES
         writer = csv.writer(csvfile)
         writer.writerow(fieldnames)
 
@@ -403,7 +577,7 @@ def batch_means_simulation():
         for arrival_rate in arrival_rates:
             plant_seeds(seed)
             print(f"Batch Means: arrival_rate {arrival_rate}")
-            data = [seed, arrival_rate]
+            data = [arrival_rate]
             data += model(arrival_rate, 1, 8192, 64)
             writer.writerow(data)
 
@@ -411,10 +585,96 @@ def batch_means_simulation():
     print(f"Batch Means Simulation time: {end - start}\n")
 
 
+def dispatch_simulation():
+    # scale out of every tier to n replicas, at the same load per replica
+    start = datetime.now()
+    seed = 123456789
+    print("Start Dispatch Simulation")
+    with open('data_horizontal_dispatch_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['policy', 'replicas', 'arrival_rate', 'run_time'] + HORIZONTAL_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        for replicas in [2, 8, 32]:
+            for load in [0.6, 0.9, 1.2]:  # arrival rate per replica, A saturates at 1.43
+                arrival_rate = round(load * replicas, 4)
+                for policy in DispatchPolicy:
+                    plant_seeds(seed)
+                    begin = datetime.now()
+                    data = model(arrival_rate, 1, B, K, (replicas, replicas, replicas), policy)
+                    run_time = (datetime.now() - begin).total_seconds()
+                    print(f"Dispatch: {policy.name}, {replicas} replicas, arrival_rate {arrival_rate}, "
+                          f"avg_response_time {data[RESPONSE_TIME]:.4f} +/- {data[RESPONSE_TIME + 1]:.4f} in {run_time:.1f}s")
+                    writer.writerow([policy.name, replicas, arrival_rate, run_time] + data)
+
+    end = datetime.now()
+    print(f"Dispatch Simulation time: {end - start}\n")
+
+
+def affinity_simulation():
+    # sticky sessions against per visit balancing of A, for the policies that look at the replicas
+    start = datetime.now()
+    seed = 123456789
+    print("Start Affinity Simulation")
+    with open('data_horizontal_affinity_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['policy', 'affinity', 'replicas', 'arrival_rate'] + HORIZONTAL_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        replicas = 8
+        for load in [0.6, 0.9, 1.2]:  # arrival rate per replica
+            arrival_rate = round(load * replicas, 4)
+            for policy in [DispatchPolicy.RANDOM, DispatchPolicy.JSQ, DispatchPolicy.LEAST_WORK]:
+                for affinity in [False, True]:
+                    plant_seeds(seed)
+                    data = model(arrival_rate, 1, B, K, (replicas, replicas, replicas), policy, affinity=affinity)
+                    print(f"Affinity: {policy.name}, affinity {affinity}, arrival_rate {arrival_rate}, "
+                          f"avg_response_time {data[RESPONSE_TIME]:.4f}, p95 {data[P95]:.4f}, "
+                          f"imbalance a {data[HORIZONTAL_FIELDNAMES.index('imbalance_a')]:.3f}")
+                    writer.writerow([policy.name, affinity, replicas, arrival_rate] + data)
+
+    end = datetime.now()
+    print(f"Affinity Simulation time: {end - start}\n")
+
+
+def autoscaling_simulation():
+    # cost and latency of autoscaling every tier from one replica, against static tiers sized for the same load
+    start = datetime.now()
+    seed = 123456789
+    print("Start Autoscaling Simulation")
+    with open('data_horizontal_autoscaling_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['scaling', 'arrival_rate'] + HORIZONTAL_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        scalings = {'static': None,
+                    'utilization': Autoscaler(ScalingMetric.UTILIZATION, 0.5, 0.8),
+                    'queue': Autoscaler(ScalingMetric.QUEUE, 1.0, 3.0)}
+        for arrival_rate in [2.0, 4.0, 8.0]:
+            for scaling, autoscaler in scalings.items():
+                plant_seeds(seed)
+                if autoscaler is None:
+                    replicas = tuple(ceil(arrival_rate * demand / 0.65) for demand in [0.7, 0.4, 0.4])
+                    data = model(arrival_rate, 1, B, K, replicas, DispatchPolicy.JSQ)
+                else:
+                    data = model(arrival_rate, 1, B, K, (1, 1, 1), DispatchPolicy.JSQ,
+                                 autoscalers=(autoscaler, autoscaler, autoscaler))
+                print(f"Autoscaling: {scaling}, arrival_rate {arrival_rate}, "
+                      f"avg_response_time {data[RESPONSE_TIME]:.4f}, p95 {data[P95]:.4f}, "
+                      f"replica-seconds per batch {data[COST]:.1f}")
+                writer.writerow([scaling, arrival_rate] + data)
+
+    end = datetime.now()
+    print(f"Autoscaling Simulation time: {end - start}\n")
+
+
 def main():
     start = datetime.now()
 
     batch_means_simulation()
+    # dispatch_simulation()
+    # affinity_simulation()
+    # autoscaling_simulation()
 
     end = datetime.now()
     print(f"Total Simulation time: {end - start}\n")
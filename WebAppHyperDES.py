@@ -74,6 +74,7 @@ class Track:
     def __init__(self):
         self.node = 0.0  # time integrated number in the node
         self.service = 0.0  # time integrated number in service
+        self.last = START  # time of the last integration
 
     def update(self, current_time, next_time, number):
         self.node += (next_time - current_time) * number
@@ -120,21 +121,27 @@ class Server:
     def get_next_complete_process_time(self):
         return self.get_min_remaining_process_time() * self.number
 
+    def update_area(self, current_time):
+        if self.number > 0:
+            self.area.update(self.area.last, current_time, self.number)
+        self.area.last = current_time
+
     def reset_stats(self, current_time):
         self.index = 0
         self.area.node = 0
         self.area.service = 0
-        self.last_event = current_time
+        self.area.last = current_time
 
         self.avg_interarrival = 0
         self.arrivals = 0
         self.interarrival_variance = 0
-        self.last_arrival = 0
+        self.last_arrival = current_time
 
         self.avg_service = 0
         self.service_variance = 0
 
     def process_arrival(self, new_job):
+        self.update_area(new_job.arrival)
         if self.number > 0:
             processed_time = (new_job.arrival - self.last_event) / self.number
             for job in self.jobs:
@@ -152,6 +159,7 @@ class Server:
         self.number += 1
 
     def process_completion(self, completion_time):
+        self.update_area(completion_time)
         if self.number > 0:
             processed_time = (completion_time - self.last_event) / self.number
             for job in self.jobs:
@@ -175,6 +183,7 @@ def model(p, arrival_rate, auth, b=0, k=0, b_improvement=False):
     global arrivalTemp
     arrivalTemp = START
     batch_enabled = b != 0 and k != 0
+    stop = INFINITY if batch_enabled else STOP  # batches run on a continuous clock until k are collected
 
     server_a = Server()
     server_b = Server()
@@ -187,19 +196,12 @@ def model(p, arrival_rate, auth, b=0, k=0, b_improvement=False):
 
     arrivals_a1 = 0  # batch measure index
     means = []
+    batch_start = START  # epoch of the current batch
 
-    while t.arrival_a < STOP or server_a.number > 0 or server_b.number > 0 or server_p.number > 0:
+    while t.arrival_a < stop or server_a.number > 0 or server_b.number > 0 or server_p.number > 0:
 
         t.next = min(t.arrival_a, t.completion_a, t.completion_b, t.completion_p)  # next event time
 
-        # update integrals
-        if server_a.number > 0:
-            server_a.area.update(t.current, t.next, server_a.number)
-        if server_b.number > 0:
-            server_b.area.update(t.current, t.next, server_b.number)
-        if server_p.number > 0:
-            server_p.area.update(t.current, t.next, server_p.number)
-
         t.current = t.next  # advance the clock
 
         # arrival_a1
@@ -207,7 +209,7 @@ def model(p, arrival_rate, auth, b=0, k=0, b_improvement=False):
             server_a.process_arrival(Job(t.arrival_a, JobType.A1))
 
             t.arrival_a = get_arrival(p, arrival_rate)
-            if t.arrival_a > STOP:
+            if t.arrival_a > stop:
                 t.last = t.current
                 t.arrival_a = INFINITY
             t.completion_a = t.current + server_a.get_next_complete_process_time()
@@ -254,7 +256,7 @@ def model(p, arrival_rate, auth, b=0, k=0, b_improvement=False):
 
         if batch_enabled and arrivals_a1 == b:
             (avg_population, avg_population_a, avg_population_b, avg_population_p, avg_response_time, utilization_a,
-             utilization_b, utilization_p) = (get_simulation_statistics(server_a, server_b, server_p, t.current))
+             utilization_b, utilization_p) = (get_simulation_statistics(server_a, server_b, server_p, t.current, batch_start))
 
             means.append(
                 [server_a.avg_interarrival, server_a.avg_service, avg_population_a, utilization_a, server_a.index,
@@ -263,24 +265,12 @@ def model(p, arrival_rate, auth, b=0, k=0, b_improvement=False):
                  avg_response_time, avg_population])
 
             arrivals_a1 = 0
-            t.completion_a -= t.current
-            t.completion_b -= t.current
-            t.completion_p -= t.current
-            t.arrival_a -= t.current
-            t.current = START
-            arrivalTemp = START
+            batch_start = t.current
 
             server_a.reset_stats(t.current)
             server_b.reset_stats(t.current)
             server_p.reset_stats(t.current)
 
-            for j in server_a.jobs:
-                j.arrival = t.current
-            for j in server_b.jobs:
-                j.arrival = t.current
-            for j in server_p.jobs:
-                j.arrival = t.current
-
             if len(means) == k:
                 data = []
                 for i in range(17):
@@ -306,15 +296,19 @@ def model(p, arrival_rate, auth, b=0, k=0, b_improvement=False):
             avg_response_time, avg_population]
 
 
-def get_simulation_statistics(server_a, server_b, server_p, current_time):
-    avg_population_a = server_a.area.node / current_time
-    utilization_a = server_a.area.service / current_time
-    avg_population_b = server_b.area.node / current_time
-    utilization_b = server_b.area.service / current_time
-    avg_population_p = server_p.area.node / current_time
-    utilization_p = server_p.area.service / current_time
+def get_simulation_statistics(server_a, server_b, server_p, current_time, start_time=START):
+    server_a.update_area(current_time)
+    server_b.update_area(current_time)
+    server_p.update_area(current_time)
+    elapsed = current_time - start_time
+    avg_population_a = server_a.area.node / elapsed
+    utilization_a = server_a.area.service / elapsed
+    avg_population_b = server_b.area.node / elapsed
+    utilization_b = server_b.area.service / elapsed
+    avg_population_p = server_p.area.node / elapsed
+    utilization_p = server_p.area.service / elapsed
     avg_response_time = 3 * server_a.avg_service + server_b.avg_service + server_p.avg_service
-    avg_population = server_a.area.node / current_time + server_b.area.node / current_time + server_p.area.node / current_time
+    avg_population = server_a.area.node / elapsed + server_b.area.node / elapsed + server_p.area.node / elapsed
     return (avg_population,
             avg_population_a, avg_population_b, avg_population_p,
             avg_response_time,
@@ -0,0 +1,483 @@
+import csv
+import math
+from datetime import datetime
+
+import numpy as np
+
+import WebAppDES
+import ps_single_server_DES
+from rngs import MODULUS, MULTIPLIER, plant_seeds, select_stream, get_seed, put_seed
+from WebAppDES import B, K, BATCH_MEANS_FIELDNAMES, JobType, get_avg_demand, get_batch_means
+
+try:
+    from numba import njit
+
+    JIT_AVAILABLE = True
+except ImportError:  # numba is optional, model() then falls back to the pure Python engines
+    JIT_AVAILABLE = False
+
+START = 0.0  # initial time
+CAPACITY = 64  # initial job slots per node, doubled when a node fills them
+STREAMS = 6  # arrival stream and one stream per job type
+
+# nodes
+NODE_A = 0
+NODE_B = 1
+NODE_P = 2
+
+# job types, also their service streams as in WebAppDES.get_service
+TYPE_A1 = JobType.A1.value
+TYPE_A2 = JobType.A2.value
+TYPE_A3 = JobType.A3.value
+TYPE_B = JobType.B.value
+TYPE_P = JobType.P.value
+
+# float statistics of a node, the fields of Server and Track
+LAST_EVENT = 0
+LAST_ARRIVAL = 1
+AVG_INTERARRIVAL = 2
+AVG_SERVICE = 3
+AREA_NODE = 4
+AREA_SERVICE = 5
+AREA_LAST = 6
+STATS = 7
+
+# integer counters of a node
+NUMBER = 0
+INDEX = 1
+ARRIVALS = 2
+COUNTS = 3
+
+
+def kernel(function):
+    # compiled when numba is installed, otherwise left as Python so its arithmetic can still be checked
+    return njit(cache=True)(function) if JIT_AVAILABLE else function
+
+
+@kernel
+def exponential(seeds, stream, m):
+    # rngs.random in Schrage form on the given stream, followed by rvgs.exponential
+    q = MODULUS // MULTIPLIER
+    r = MODULUS % MULTIPLIER
+    t = MULTIPLIER * (seeds[stream] % q) - r * (seeds[stream] // q)
+    if t > 0:
+        seeds[stream] = t
+    else:
+        seeds[stream] = t + MODULUS
+    return -m * math.log(1.0 - seeds[stream] / MODULUS)
+
+
+@kernel
+def grow(arrival, remaining, job_type):
+    nodes, capacity = arrival.shape
+    new_arrival = np.zeros((nodes, 2 * capacity))
+    new_remaining = np.zeros((nodes, 2 * capacity))
+    new_job_type = np.zeros((nodes, 2 * capacity), dtype=np.int64)
+    new_arrival[:, :capacity] = arrival
+    new_remaining[:, :capacity] = remaining
+    new_job_type[:, :capacity] = job_type
+    return new_arrival, new_remaining, new_job_type
+
+
+@kernel
+def update_area(stats, counts, node, current_time):
+    if counts[node, NUMBER] > 0:
+        stats[node, AREA_NODE] += (current_time - stats[node, AREA_LAST]) * counts[node, NUMBER]
+        stats[node, AREA_SERVICE] += (current_time - stats[node, AREA_LAST])
+    stats[node, AREA_LAST] = current_time
+
+
+@kernel
+def process_time(remaining, stats, counts, node, current_time):
+    # the same per-job decrement as Server.process_arrival and Server.process_completion
+    update_area(stats, counts, node, current_time)
+    if counts[node, NUMBER] > 0:
+        processed_time = (current_time - stats[node, LAST_EVENT]) / counts[node, NUMBER]
+        for i in range(counts[node, NUMBER]):
+            remaining[node, i] -= processed_time
+    stats[node, LAST_EVENT] = current_time
+
+
+@kernel
+def process_arrival(arrival, remaining, job_type, stats, counts, node, current_time, new_job_type, service):
+    process_time(remaining, stats, counts, node, current_time)
+
+    counts[node, ARRIVALS] += 1
+    d = current_time - stats[node, LAST_ARRIVAL] - stats[node, AVG_INTERARRIVAL]
+    stats[node, LAST_ARRIVAL] = current_time
+    stats[node, AVG_INTERARRIVAL] += d / counts[node, ARRIVALS]
+
+    slot = counts[node, NUMBER]
+    arrival[node, slot] = current_time
+    remaining[node, slot] = service
+    job_type[node, slot] = new_job_type
+    counts[node, NUMBER] += 1
+
+
+@kernel
+def process_completion(arrival, remaining, job_type, stats, counts, node, completion_time):
+    process_time(remaining, stats, counts, node, completion_time)
+
+    slot = 0
+    for i in range(1, counts[node, NUMBER]):
+        if remaining[node, i] < remaining[node, slot]:
+            slot = i
+    completed_arrival = arrival[node, slot]
+    completed_type = job_type[node, slot]
+    last = counts[node, NUMBER] - 1
+    arrival[node, slot] = arrival[node, last]
+    remaining[node, slot] = remaining[node, last]
+    job_type[node, slot] = job_type[node, last]
+    counts[node, INDEX] += 1
+    counts[node, NUMBER] -= 1
+
+    d = completion_time - completed_arrival - stats[node, AVG_SERVICE]
+    stats[node, AVG_SERVICE] += d / counts[node, INDEX]
+
+    return completed_arrival, completed_type
+
+
+@kernel
+def get_next_complete_process_time(remaining, counts, node):
+    min_remaining = remaining[node, 0]
+    for i in range(1, counts[node, NUMBER]):
+        if remaining[node, i] < min_remaining:
+            min_remaining = remaining[node, i]
+    return min_remaining * counts[node, NUMBER]
+
+
+@kernel
+def reset_stats(stats, counts, node, current_time):
+    counts[node, INDEX] = 0
+    stats[node, AREA_NODE] = 0.0
+    stats[node, AREA_SERVICE] = 0.0
+    stats[node, AREA_LAST] = current_time
+
+    stats[node, AVG_INTERARRIVAL] = 0.0
+    counts[node, ARRIVALS] = 0
+    stats[node, LAST_ARRIVAL] = current_time
+
+    stats[node, AVG_SERVICE] = 0.0
+
+
+@kernel
+def get_observation(stats, counts, class_avg_service, current_time, start_time, observation):
+    # WebAppDES.get_simulation_statistics, written in the order of the rows yielded by WebAppDES.simulate
+    for node in range(3):
+        update_area(stats, counts, node, current_time)
+    elapsed = current_time - start_time
+    for node in range(3):
+        observation[5 * node] = stats[node, AVG_INTERARRIVAL]
+        observation[5 * node + 1] = stats[node, AVG_SERVICE]
+        observation[5 * node + 2] = stats[node, AREA_NODE] / elapsed
+        observation[5 * node + 3] = stats[node, AREA_SERVICE] / elapsed
+        observation[5 * node + 4] = counts[node, INDEX]
+    observation[15] = (class_avg_service[0] + class_avg_service[1] + class_avg_service[2] +
+                       stats[NODE_B, AVG_SERVICE] + stats[NODE_P, AVG_SERVICE])
+    observation[16] = (stats[NODE_A, AREA_NODE] / elapsed + stats[NODE_B, AREA_NODE] / elapsed +
+                       stats[NODE_P, AREA_NODE] / elapsed)
+
+
+@kernel
+def network_kernel(seeds, arrival_rate, demands, b, k, stop, infinity):
+    # WebAppDES.simulate on typed arrays. demands and seeds are indexed by job type value (seeds[0] is the
+    # arrival stream); returns one observation per batch, or the final observation when b = 0
+    arrival = np.zeros((3, CAPACITY))
+    remaining = np.zeros((3, CAPACITY))
+    job_type = np.zeros((3, CAPACITY), dtype=np.int64)
+    stats = np.zeros((3, STATS))
+    counts = np.zeros((3, COUNTS), dtype=np.int64)
+    class_index = np.zeros(3, dtype=np.int64)  # per class completions at A, as kept by JobStats
+    class_avg_service = np.zeros(3)
+    observations = np.zeros((max(k, 1), 17))
+    batch_enabled = b != 0 and k != 0
+
+    current = START
+    arrival_temp = START + exponential(seeds, 0, 1.0 / arrival_rate)
+    arrival_a = arrival_temp
+    completion_a = infinity
+    completion_b = infinity
+    completion_p = infinity
+
+    arrivals_a1 = 0
+    batches = 0
+    batch_start = START
+
+    while arrival_a < stop or counts[NODE_A, NUMBER] > 0 or counts[NODE_B, NUMBER] > 0 or \
+            counts[NODE_P, NUMBER] > 0:
+        if max(counts[NODE_A, NUMBER], counts[NODE_B, NUMBER], counts[NODE_P, NUMBER]) == arrival.shape[1]:
+            arrival, remaining, job_type = grow(arrival, remaining, job_type)
+
+        current = min(arrival_a, completion_a, completion_b, completion_p)
+
+        # arrival_a1
+        if current == arrival_a:
+            service = exponential(seeds, TYPE_A1, demands[TYPE_A1])
+            process_arrival(arrival, remaining, job_type, stats, counts, NODE_A, arrival_a, TYPE_A1, service)
+            arrival_temp += exponential(seeds, 0, 1.0 / arrival_rate)
+            arrival_a = arrival_temp
+            if arrival_a > stop:
+                arrival_a = infinity
+            completion_a = current + get_next_complete_process_time(remaining, counts, NODE_A)
+            arrivals_a1 += 1
+
+        # completion_a
+        elif current == completion_a:
+            completed_arrival, completed_type = process_completion(arrival, remaining, job_type, stats, counts,
+                                                                   NODE_A, completion_a)
+            c = completed_type - TYPE_A1
+            class_index[c] += 1
+            d = current - completed_arrival - class_avg_service[c]
+            class_avg_service[c] += d / class_index[c]
+
+            if completed_type == TYPE_A1:
+                service = exponential(seeds, TYPE_B, demands[TYPE_B])
+                process_arrival(arrival, remaining, job_type, stats, counts, NODE_B, completion_a, TYPE_B, service)
+                completion_b = current + get_next_complete_process_time(remaining, counts, NODE_B)
+            elif completed_type == TYPE_A2:
+                service = exponential(seeds, TYPE_P, demands[TYPE_P])
+                process_arrival(arrival, remaining, job_type, stats, counts, NODE_P, current, TYPE_P, service)
+                completion_p = current + get_next_complete_process_time(remaining, counts, NODE_P)
+
+            if counts[NODE_A, NUMBER] > 0:
+                completion_a = current + get_next_complete_process_time(remaining, counts, NODE_A)
+            else:
+                completion_a = infinity
+
+        # completion_b
+        elif current == completion_b:
+            process_completion(arrival, remaining, job_type, stats, counts, NODE_B, completion_b)
+            service = exponential(seeds, TYPE_A2, demands[TYPE_A2])
+            process_arrival(arrival, remaining, job_type, stats, counts, NODE_A, current, TYPE_A2, service)
+            completion_a = current + get_next_complete_process_time(remaining, counts, NODE_A)
+
+            if counts[NODE_B, NUMBER] > 0:
+                completion_b = current + get_next_complete_process_time(remaining, counts, NODE_B)
+            else:
+                completion_b = infinity
+
+        # completion_p
+        elif current == completion_p:
+            process_completion(arrival, remaining, job_type, stats, counts, NODE_P, completion_p)
+            service = exponential(seeds, TYPE_A3, demands[TYPE_A3])
+            process_arrival(arrival, remaining, job_type, stats, counts, NODE_A, current, TYPE_A3, service)
+            completion_a = current + get_next_complete_process_time(remaining, counts, NODE_A)
+
+            if counts[NODE_P, NUMBER] > 0:
+                completion_p = current + get_next_complete_process_time(remaining, counts, NODE_P)
+            else:
+                completion_p = infinity
+
+        if batch_enabled and arrivals_a1 == b:
+            get_observation(stats, counts, class_avg_service, current, batch_start, observations[batches])
+
+            arrivals_a1 = 0
+            batch_start = current
+            for node in range(3):
+                reset_stats(stats, counts, node, current)
+            class_index[:] = 0
+            class_avg_service[:] = 0.0
+
+            batches += 1
+            if batches == k:
+                return observations
+
+    get_observation(stats, counts, class_avg_service, current, START, observations[0])
+    return observations[:1]
+
+
+@kernel
+def single_server_kernel(seeds, arrival_rate, demand, b, k, stop, infinity):
+    # ps_single_server_DES.model on typed arrays, returning one observation per batch or the final one
+    arrival = np.zeros((1, CAPACITY))
+    remaining = np.zeros((1, CAPACITY))
+    job_type = np.zeros((1, CAPACITY), dtype=np.int64)
+    stats = np.zeros((1, STATS))
+    counts = np.zeros((1, COUNTS), dtype=np.int64)
+    observations = np.zeros((max(k, 1), 5))
+    batch_enabled = b != 0 and k != 0
+
+    current = START
+    arrival_temp = START + exponential(seeds, 0, 1.0 / arrival_rate)
+    arrival_a = arrival_temp
+    completion_a = infinity
+
+    arrivals_a = 0
+    batches = 0
+    batch_start = START
+
+    while arrival_a < stop or counts[NODE_A, NUMBER] > 0:
+        if counts[NODE_A, NUMBER] == arrival.shape[1]:
+            arrival, remaining, job_type = grow(arrival, remaining, job_type)
+
+        current = min(arrival_a, completion_a)
+
+        # arrival_a
+        if current == arrival_a:
+            service = exponential(seeds, 1, demand)
+            process_arrival(arrival, remaining, job_type, stats, counts, NODE_A, arrival_a, TYPE_A1, service)
+            arrival_temp += exponential(seeds, 0, 1.0 / arrival_rate)
+            arrival_a = arrival_temp
+            if arrival_a > stop:
+                arrival_a = infinity
+            completion_a = current + get_next_complete_process_time(remaining, counts, NODE_A)
+            arrivals_a += 1
+
+        # completion_a
+        elif current == completion_a:
+            process_completion(arrival, remaining, job_type, stats, counts, NODE_A, completion_a)
+
+            if counts[NODE_A, NUMBER] > 0:
+                completion_a = current + get_next_complete_process_time(remaining, counts, NODE_A)
+            else:
+                completion_a = infinity
+
+        if batch_enabled and arrivals_a == b:
+            observation = observations[batches]
+            observation[0] = stats[NODE_A, AVG_INTERARRIVAL]
+            observation[1] = stats[NODE_A, AVG_SERVICE]
+            observation[2] = stats[NODE_A, AREA_NODE] / (current - batch_start)
+            observation[3] = stats[NODE_A, AREA_SERVICE] / (current - batch_start)
+            observation[4] = counts[NODE_A, INDEX]
+
+            arrivals_a = 0
+            batch_start = current
+            reset_stats(stats, counts, NODE_A, current)
+
+            batches += 1
+            if batches == k:
+                return observations
+
+    observation = observations[0]
+    observation[0] = stats[NODE_A, AVG_INTERARRIVAL]
+    observation[1] = stats[NODE_A, AVG_SERVICE]
+    observation[2] = stats[NODE_A, AREA_NODE] / current
+    observation[3] = stats[NODE_A, AREA_SERVICE] / current
+    observation[4] = counts[NODE_A, INDEX]
+    return observations[:1]
+
+
+def get_seeds():
+    # the current state of the rngs streams used by the models
+    seeds = np.zeros(STREAMS, dtype=np.int64)
+    for s in range(STREAMS):
+        select_stream(s)
+        seeds[s] = get_seed()
+    return seeds
+
+
+def put_seeds(seeds):
+    # leaves the rngs streams where the pure Python engines would have left them
+    for s in range(STREAMS):
+        select_stream(s)
+        put_seed(int(seeds[s]))
+
+
+def get_data(observations, b, k, completions):
+    rows = []
+    for observation in observations:
+        row = [float(value) for value in observation]
+        for i in completions:
+            row[i] = int(row[i])
+        rows.append(row)
+    if b != 0 and k != 0:
+        return get_batch_means(rows)
+    return rows[0]
+
+
+def run_network(network, arrival_rate, auth, b=0, k=0, b_improvement=False):
+    demands = np.zeros(STREAMS)
+    for job_type in JobType:
+        demands[job_type.value] = get_avg_demand(job_type, auth, b_improvement)
+    stop = WebAppDES.INFINITY if b != 0 and k != 0 else WebAppDES.STOP
+    seeds = get_seeds()
+    observations = network(seeds, arrival_rate, demands, b, k, stop, WebAppDES.INFINITY)
+    put_seeds(seeds)
+    return get_data(observations, b, k, [4, 9, 14])
+
+
+def run_single_server(single_server, arrival_rate, b=0, k=0):
+    stop = ps_single_server_DES.INFINITY if b != 0 and k != 0 else ps_single_server_DES.STOP
+    seeds = get_seeds()
+    observations = single_server(seeds, arrival_rate, 0.7, b, k, stop, ps_single_server_DES.INFINITY)
+    put_seeds(seeds)
+    return get_data(observations, b, k, [4])
+
+
+def model(arrival_rate, auth, b=0, k=0, b_improvement=False):
+    # drop-in replacement of WebAppDES.model
+    if not JIT_AVAILABLE:
+        return WebAppDES.model(arrival_rate, auth, b, k, b_improvement)
+    return run_network(network_kernel, arrival_rate, auth, b, k, b_improvement)
+
+
+def single_server_model(arrival_rate, b=0, k=0):
+    # drop-in replacement of ps_single_server_DES.model
+    if not JIT_AVAILABLE:
+        return ps_single_server_DES.model(arrival_rate, b, k)
+    return run_single_server(single_server_kernel, arrival_rate, b, k)
+
+
+def verify(b=256, k=8):
+    # runs the kernels, compiled when numba is installed and as plain Python otherwise, against the pure Python
+    # engines, expecting the same rows; the kernels pop the first of several jobs with the same remaining work,
+    # which only matters on exact ties
+    seed = 123456789
+    mismatches = 0
+    for arrival_rate in [0.5, 0.9, 1.2]:
+        for auth in [1, 2]:
+            plant_seeds(seed)
+            expected = WebAppDES.model(arrival_rate, auth, b, k)
+            plant_seeds(seed)
+            data = run_network(network_kernel, arrival_rate, auth, b, k)
+            if data != expected:
+                mismatches += 1
+                print(f"Kernel mismatch: network, arrival_rate {arrival_rate}, auth type {auth}")
+
+        plant_seeds(seed)
+        expected = ps_single_server_DES.model(arrival_rate, b, k)
+        plant_seeds(seed)
+        data = run_single_server(single_server_kernel, arrival_rate, b, k)
+        if data != expected:
+            mismatches += 1
+            print(f"Kernel mismatch: single server, arrival_rate {arrival_rate}")
+
+    print(f"Kernel verification: {mismatches} mismatches")
+    return mismatches == 0
+
+
+def obj_1_2_batch_means_simulation():
+    start = datetime.now()
+    seed = 123456789
+    print(f"Start JIT Batch Means Simulation (compiled: {JIT_AVAILABLE})")
+    with open('data_obj_1_2_jit_batch_means.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        auth_types = [1, 2]
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+        for auth in auth_types:
+            for arrival_rate in arrival_rates:
+                plant_seeds(seed)
+                print(f"JIT Batch Means: arrival_rate {arrival_rate} and auth type {auth}")
+                data = [auth, arrival_rate]
+                data += model(arrival_rate, auth, B, K)
+                writer.writerow(data)
+
+    end = datetime.now()
+    print(f"JIT Batch Means Simulation time: {end - start}\n")
+
+
+def main():
+    start = datetime.now()
+
+    verify()
+    obj_1_2_batch_means_simulation()
+
+    end = datetime.now()
+    print(f"Total Simulation time: {end - start}\n")
+
+
+if __name__ == "__main__":
+    main()
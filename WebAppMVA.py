@@ -0,0 +1,147 @@
+import csv
+from datetime import datetime
+
+from WebAppDES import B, BATCH_MEANS_FIELDNAMES, JobType, get_avg_demand
+
+INFINITY = float('inf')  # metrics of an unstable node
+
+
+def get_node_demands(auth=1, b_improvement=False):
+    demand_a = (get_avg_demand(JobType.A1, auth, b_improvement) + get_avg_demand(JobType.A2, auth, b_improvement) +
+                get_avg_demand(JobType.A3, auth, b_improvement))
+    demand_b = get_avg_demand(JobType.B, auth, b_improvement)
+    demand_p = get_avg_demand(JobType.P, auth, b_improvement)
+    return demand_a, demand_b, demand_p
+
+
+def get_saturation_rate(auth=1, b_improvement=False):
+    return 1.0 / max(get_node_demands(auth, b_improvement))
+
+
+def get_node_statistics(arrival_rate, demand, visits):
+    # open PS node with exponential demands (BCMP product form): R = D / (1 - U), N = U / (1 - U)
+    utilization = arrival_rate * demand
+    if utilization >= 1:
+        return INFINITY, INFINITY, utilization
+    avg_service = demand / visits / (1 - utilization)
+    avg_population = utilization / (1 - utilization)
+    return avg_service, avg_population, utilization
+
+
+def model(arrival_rate, auth, b=B, b_improvement=False):
+    demand_a, demand_b, demand_p = get_node_demands(auth, b_improvement)
+
+    avg_service_a, avg_population_a, utilization_a = get_node_statistics(arrival_rate, demand_a, 3)
+    avg_service_b, avg_population_b, utilization_b = get_node_statistics(arrival_rate, demand_b, 1)
+    avg_service_p, avg_population_p, utilization_p = get_node_statistics(arrival_rate, demand_p, 1)
+
+    # same composition as get_simulation_statistics: the three A visits plus B and P
+    avg_response_time = 3 * avg_service_a + avg_service_b + avg_service_p
+    avg_population = avg_population_a + avg_population_b + avg_population_p
+
+    # completions are the visits generated by a batch of b arrivals
+    return [1.0 / (3 * arrival_rate), avg_service_a, avg_population_a, utilization_a, 3 * b,
+            1.0 / arrival_rate, avg_service_b, avg_population_b, utilization_b, b,
+            1.0 / arrival_rate, avg_service_p, avg_population_p, utilization_p, b,
+            avg_response_time, avg_population]
+
+
+def get_arrival_rates(auth=1, b_improvement=False, points=15, min_rate=0.5, max_utilization=0.95):
+    # rates spaced evenly in response time, so the grid gets denser towards the saturation knee
+    max_rate = max_utilization * get_saturation_rate(auth, b_improvement)
+    min_response_time = model(min_rate, auth, b_improvement=b_improvement)[15]
+    max_response_time = model(max_rate, auth, b_improvement=b_improvement)[15]
+
+    arrival_rates = []
+    for i in range(points):
+        target = min_response_time + (max_response_time - min_response_time) * i / (points - 1)
+        low, high = min_rate, max_rate
+        for _ in range(60):
+            middle = (low + high) / 2
+            if model(middle, auth, b_improvement=b_improvement)[15] < target:
+                low = middle
+            else:
+                high = middle
+        arrival_rates.append(round((low + high) / 2, 4))
+    return arrival_rates
+
+
+def validate(filename, auth=1, b_improvement=False):
+    # compares a batch means csv against the analytic metrics and returns the rows outside the ci
+    mismatches = []
+    total = 0
+    with open(filename, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            row_auth = int(row.get('auth', auth))
+            row_b_improvement = row.get('b_improvement', str(b_improvement)) == 'True'
+            arrival_rate = float(row['arrival_rate'])
+            expected = model(arrival_rate, row_auth, b_improvement=row_b_improvement)
+            for i in range(0, len(BATCH_MEANS_FIELDNAMES), 2):
+                metric = BATCH_MEANS_FIELDNAMES[i]
+                if metric.startswith('completion'):
+                    continue  # depends on the batch size of the run
+                total += 1
+                mean = float(row[metric])
+                ci = float(row[BATCH_MEANS_FIELDNAMES[i + 1]])
+                if abs(mean - expected[i // 2]) > ci:
+                    mismatches.append((row_auth, row_b_improvement, arrival_rate, metric, mean, ci, expected[i // 2]))
+
+    print(f"Validation of {filename}: {total - len(mismatches)}/{total} metrics within the confidence interval")
+    for mismatch in mismatches:
+        print("    auth {}, b improvement {}, arrival_rate {}: {} = {:.4f} +/- {:.4f}, analytic {:.4f}".format(*mismatch))
+    return mismatches
+
+
+def obj_1_2_analytic():
+    start = datetime.now()
+    print("Start Analytic Solution")
+    with open('data_obj_1_2_mva.csv', 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['auth', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES)
+
+        auth_types = [1, 2]
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+        for auth in auth_types:
+            print(f"Analytic: auth type {auth}, saturation at arrival_rate {get_saturation_rate(auth):.4f}")
+            for arrival_rate in arrival_rates:
+                data = [auth, arrival_rate]
+                for value in model(arrival_rate, auth):
+                    data += [value, 0.0]
+                writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Analytic Solution time: {end - start}\n")
+
+
+def obj3_analytic():
+    start = datetime.now()
+    print("Start Analytic Solution Objective 3")
+    with open('data_obj_3_mva.csv', 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['b_improvement', 'arrival_rate'] + BATCH_MEANS_FIELDNAMES)
+
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2, 1.25,
+                         1.3, 1.35, 1.4]
+        for b_improvement in [True, False]:
+            print(f"Analytic: improvement {b_improvement}, "
+                  f"saturation at arrival_rate {get_saturation_rate(1, b_improvement):.4f}")
+            for arrival_rate in arrival_rates:
+                data = [b_improvement, arrival_rate]
+                for value in model(arrival_rate, 1, b_improvement=b_improvement):
+                    data += [value, 0.0]
+                writer.writerow(data)
+
+    end = datetime.now()
+    print(f"Objective 3 Analytic Solution time: {end - start}\n")
+
+
+def main():
+    obj_1_2_analytic()
+    obj3_analytic()
+
+    validate('data_obj_1_2_batch_means.csv')
+    validate('data_obj_3_batch_means.csv')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import csv
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+from rvms import idfStudent
+from WebAppDES import ALPHA, K
+from WebAppDecomposition import get_hyper_scv, read_batch_means
+
+FEATURES = ['arrival_rate', 'auth', 'b_improvement', 'arrival_scv', 'replicas']
+
+# batch means files and the configuration they were run with, for the features missing from their columns
+DATASETS = [('data_obj_1_2_batch_means.csv', {'b_improvement': False}),
+            ('data_obj_3_batch_means.csv', {'auth': 1}),
+            ('data_hyper_batch_means.csv', {'auth': 1, 'b_improvement': False}),
+            ('data_horizontalA_batch_means.csv', {'auth': 1, 'b_improvement': True, 'replicas': 2})]
+
+ROUNDS = 50  # coordinate search rounds over the kernel hyperparameters
+JITTER = 1e-8
+
+
+def get_features(arrival_rate, auth=1, b_improvement=False, arrival_scv=1.0, replicas=1):
+    return [arrival_rate, auth, float(b_improvement), arrival_scv, replicas]
+
+
+def read_dataset(filename, configuration, metric):
+    # (features, mean, ci) of every row of a batch means file, with the arrival variability of the hyper
+    # model given as its squared coefficient of variation
+    data = []
+    for row in read_batch_means(filename):
+        if metric not in row:
+            return []
+        values = dict(configuration)
+        values.update({feature: row[feature] for feature in ['arrival_rate', 'auth'] if feature in row})
+        if 'b_improvement' in row:
+            values['b_improvement'] = row['b_improvement'] == 'True'
+        if 'p' in row:
+            values['arrival_scv'] = get_hyper_scv(float(row['p']))
+        features = get_features(float(values['arrival_rate']), int(values.get('auth', 1)),
+                                values.get('b_improvement', False), values.get('arrival_scv', 1.0),
+                                values.get('replicas', 1))
+        data.append((features, float(row[metric]), float(row[metric + '_ci'])))
+    return data
+
+
+class Surrogate:
+    # GP regression with a squared exponential kernel (one length scale per feature) and a known noise
+    # variance per point, from the ci of the batch means. Positive metrics are fitted in log space, where
+    # their growth towards saturation is closer to the smooth prior
+    def __init__(self, features, means, cis, k=K):
+        self.x = np.array(features, dtype=float)
+        self.scale = np.maximum(self.x.max(axis=0) - self.x.min(axis=0), 1e-12)
+        means = np.array(means)
+        sd = np.array(cis) / idfStudent(k - 1, 1 - ALPHA / 2)
+        self.log = bool((means > 0).all())
+        if self.log:
+            self.y = np.log(means)
+            self.noise = (sd / means) ** 2
+        else:
+            self.y = means
+            self.noise = sd ** 2
+        self.offset = self.y.mean()
+        self.length = np.ones(self.x.shape[1])
+        self.variance = max(self.y.var(), JITTER)
+        self.fit()
+
+    def get_kernel(self, a, b, length=None, variance=None):
+        length = self.length if length is None else length
+        variance = self.variance if variance is None else variance
+        d = (a[:, None, :] - b[None, :, :]) / (self.scale * length)
+        return variance * np.exp(-0.5 * (d * d).sum(axis=2))
+
+    def get_log_likelihood(self, length, variance):
+        kernel = self.get_kernel(self.x, self.x, length, variance) + np.diag(self.noise + JITTER)
+        try:
+            cholesky = np.linalg.cholesky(kernel)
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = np.linalg.solve(kernel, self.y - self.offset)
+        return (-0.5 * (self.y - self.offset) @ alpha - np.log(np.diag(cholesky)).sum() -
+                0.5 * len(self.y) * np.log(2 * np.pi))
+
+    def fit(self):
+        # coordinate search on the log marginal likelihood, halving and doubling one hyperparameter at a time
+        best = self.get_log_likelihood(self.length, self.variance)
+        for _ in range(ROUNDS):
+            improved = False
+            for i in range(len(self.length) + 1):
+                for factor in [0.5, 2.0]:
+                    length = self.length.copy()
+                    variance = self.variance
+                    if i < len(self.length):
+                        length[i] *= factor
+                    else:
+                        variance *= factor
+                    likelihood = self.get_log_likelihood(length, variance)
+                    if likelihood > best:
+                        best = likelihood
+                        self.length = length
+                        self.variance = variance
+                        improved = True
+            if not improved:
+                break
+        self.log_likelihood = best
+
+        kernel = self.get_kernel(self.x, self.x) + np.diag(self.noise + JITTER)
+        self.inverse = np.linalg.inv(kernel)
+        self.alpha = self.inverse @ (self.y - self.offset)
+
+    def predict_latent(self, features):
+        # posterior mean and variance of the metric (in log space when fitted there)
+        x = np.array(features, dtype=float)
+        d = (self.x - x) / (self.scale * self.length)
+        k = self.variance * np.exp(-0.5 * (d * d).sum(axis=1))
+        return self.offset + k @ self.alpha, max(self.variance - k @ self.inverse @ k, 0.0)
+
+    def predict(self, features, z=1.96):
+        # mean and ci half width of the metric at a configuration
+        mean, variance = self.predict_latent(features)
+        sd = np.sqrt(variance)
+        if self.log:
+            return float(np.exp(mean)), float((np.exp(mean + z * sd) - np.exp(mean - z * sd)) / 2)
+        return float(mean), float(z * sd)
+
+    def get_loo_errors(self):
+        # closed form leave-one-out predictions of the GP (the observation minus its residual), relative to the
+        # observed means in both spaces
+        residuals = self.alpha / np.diag(self.inverse)
+        if self.log:
+            return np.exp(-residuals) - 1
+        return -residuals / self.y
+
+    def get_next_point(self, candidates):
+        # the most informative candidate to simulate next: the posterior variance times one minus the correlation
+        # with the nearest simulated point, which is zero on a simulated point and grows in the gaps between them.
+        # Beyond the range of the data the variance only grows with the distance, so those candidates are left
+        # out; None when no candidate is inside
+        low = self.x.min(axis=0)
+        high = self.x.max(axis=0)
+        best_score = -1.0
+        best_point = None
+        for features in candidates:
+            x = np.array(features, dtype=float)
+            if (x < low).any() or (x > high).any():
+                continue
+            d = (self.x - x) / (self.scale * self.length)
+            correlation = np.exp(-0.5 * (d * d).sum(axis=1)).max()
+            score = self.predict_latent(features)[1] * (1 - correlation)
+            if score > best_score:
+                best_score = score
+                best_point = features
+        return best_point
+
+
+def fit_surrogate(metric, datasets=DATASETS):
+    data = []
+    for filename, configuration in datasets:
+        data += read_dataset(filename, configuration, metric)
+    return Surrogate([row[0] for row in data], [row[1] for row in data], [row[2] for row in data])
+
+
+def surrogate_queries(metric='avg_response_time'):
+    start = datetime.now()
+    print(f"Start Surrogate Fit of {metric}")
+    surrogate = fit_surrogate(metric)
+    errors = np.abs(surrogate.get_loo_errors())
+    print(f"Surrogate: {len(surrogate.y)} points, length scales " +
+          ", ".join(f"{feature} {length * scale:.3g}"
+                    for feature, length, scale in zip(FEATURES, surrogate.length, surrogate.scale)) +
+          f", leave-one-out relative error mean {100 * errors.mean():.1f}%, max {100 * errors.max():.1f}%")
+
+    configurations = [('auth 1', get_features(0, 1)), ('auth 2', get_features(0, 2)),
+                      ('b improvement', get_features(0, 1, True)),
+                      ('hyper p 0.1', get_features(0, 1, arrival_scv=get_hyper_scv(0.1))),
+                      ('horizontal', get_features(0, 1, True, replicas=2))]
+    arrival_rates = [round(0.5 + 0.01 * i, 2) for i in range(71)]
+    with open(f'data_surrogate_{metric}.csv', 'w', newline='') as csvfile:
+        fieldnames = ['configuration'] + FEATURES + [metric, metric + '_ci']
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        begin = perf_counter()
+        for name, configuration in configurations:
+            candidates = [[arrival_rate] + configuration[1:] for arrival_rate in arrival_rates]
+            for features in candidates:
+                writer.writerow([name] + features + list(surrogate.predict(features)))
+            next_point = surrogate.get_next_point(candidates)
+            if next_point is None:
+                print(f"Surrogate: {name}, outside the range of the data")
+            else:
+                print(f"Surrogate: {name}, next arrival_rate to simulate {next_point[0]}")
+        queries = len(configurations) * len(arrival_rates)
+        print(f"Surrogate: {1e6 * (perf_counter() - begin) / queries:.0f} us per query")
+
+    end = datetime.now()
+    print(f"Surrogate time: {end - start}\n")
+
+
+def main():
+    surrogate_queries()
+
+
+if __name__ == "__main__":
+    main()
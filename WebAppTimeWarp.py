@@ -0,0 +1,447 @@
+import copy
+import csv
+import heapq
+import multiprocessing
+import queue
+from datetime import datetime
+from time import perf_counter, sleep
+
+import WebAppDES
+from rngs import plant_seeds, select_stream, get_seed, put_seed
+from rvgs import exponential
+from WebAppDES import JobType, get_service
+
+START = 0.0  # initial time
+STOP = 28800.0  # terminal time
+INFINITY = WebAppDES.INFINITY  # no pending event
+CHUNK = 64  # events executed between two flushes of the outgoing messages
+WINDOW = 10.0  # optimism bound: no event later than GVT + WINDOW is executed before the next GVT round
+GVT_INTERVAL = 0.02  # wall clock seconds between two GVT computations
+
+# logical processes, one per node
+LP_A = 0
+LP_B = 1
+LP_P = 2
+LP_NAMES = ['A', 'B', 'P']
+STREAMS = [[0, 1, 2, 3], [4], [5]]  # rngs streams owned by each node, as used by WebAppDES
+
+# event priorities at equal timestamps, in the order of the if/elif chain of WebAppDES.simulate
+ARRIVAL = 0  # external arrival at A
+COMPLETION = 1
+MESSAGE = [2, 0, 0]  # at A transfers come after its own events, at B and P before the completion
+
+# job type leaving a node -> (destination, job type at the destination)
+ROUTES = {JobType.A1: (LP_B, JobType.B),
+          JobType.A2: (LP_P, JobType.P),
+          JobType.B: (LP_A, JobType.A2),
+          JobType.P: (LP_A, JobType.A3)}
+
+
+class NodeState:
+    # everything a rollback restores. Job lists are replaced on every event and never changed in place,
+    # so a shallow copy is a complete checkpoint
+    def __init__(self, lp):
+        self.lvt = (START, -1, -1)  # key of the last executed event
+        self.arrival = []  # arrival times of the jobs in the node
+        self.remaining = []
+        self.job_type = []
+        self.completion = INFINITY  # next completion time
+        self.last_event = 0
+
+        self.index = 0  # used to count departed jobs
+        self.arrivals = 0
+        self.last_arrival = 0
+        self.avg_interarrival = 0
+        self.avg_service = 0
+        self.area_node = 0.0  # time integrated number in the node
+        self.area_service = 0.0  # time integrated number in service
+        self.area_last = START
+
+        # per class response times at A, as kept by the JobStats of WebAppDES
+        self.class_index = (0, 0, 0)
+        self.class_avg_service = (0, 0, 0)
+
+        self.arrival_temp = START  # external arrivals, A only
+        self.arrival_a = INFINITY
+        self.seeds = ()
+
+
+class LogicalProcess:
+    def __init__(self, lp, arrival_rate, auth, b_improvement, stop, window, inboxes, reports):
+        self.lp = lp
+        self.arrival_rate = arrival_rate
+        self.auth = auth
+        self.b_improvement = b_improvement
+        self.stop = stop
+        self.window = window
+        self.inbox = inboxes[lp]
+        self.inboxes = inboxes
+        self.reports = reports
+
+        self.state = NodeState(lp)
+        if lp == LP_A:
+            select_stream(0)
+            self.state.arrival_temp += exponential(1.0 / arrival_rate)
+            self.state.arrival_a = self.state.arrival_temp
+        self.save_seeds()
+        self.states = [copy.copy(self.state)]  # checkpoint after every executed event
+
+        self.pending = []  # heap of unprocessed transfers (time, priority, id, job type)
+        self.processed = []  # executed transfers, in execution order
+        self.processed_ids = set()
+        self.annihilated = set()  # ids of pending transfers cancelled by an anti-message
+        self.sent = []  # (send key, destination, id, time, job type) of the transfers sent
+        self.outbox = [[] for _ in inboxes]
+
+        self.gvt = START
+        self.paused = False
+        self.done = False
+        self.counter = 0
+        self.sent_count = 0
+        self.received_count = 0
+        self.executed = 0
+        self.rolled_back = 0
+        self.rollbacks = 0
+
+    def save_seeds(self):
+        seeds = []
+        for s in STREAMS[self.lp]:
+            select_stream(s)
+            seeds.append(get_seed())
+        self.state.seeds = tuple(seeds)
+
+    def restore_seeds(self):
+        for s, seed in zip(STREAMS[self.lp], self.state.seeds):
+            select_stream(s)
+            put_seed(seed)
+
+    def update_area(self, current_time):
+        state = self.state
+        if state.remaining:
+            state.area_node += (current_time - state.area_last) * len(state.remaining)
+            state.area_service += (current_time - state.area_last)
+        state.area_last = current_time
+
+    def process_time(self, current_time):
+        # the same per-job decrement as WebAppDES.Server
+        state = self.state
+        self.update_area(current_time)
+        if state.remaining:
+            processed_time = (current_time - state.last_event) / len(state.remaining)
+            state.remaining = [remaining - processed_time for remaining in state.remaining]
+        state.last_event = current_time
+
+    def get_next_completion(self, current_time):
+        state = self.state
+        if state.remaining:
+            return current_time + min(state.remaining) * len(state.remaining)
+        return INFINITY
+
+    def process_arrival(self, current_time, job_type):
+        state = self.state
+        service = get_service(job_type, self.auth, self.b_improvement)
+        self.process_time(current_time)
+
+        state.arrivals += 1
+        d = current_time - state.last_arrival - state.avg_interarrival
+        state.last_arrival = current_time
+        state.avg_interarrival += d / state.arrivals
+
+        state.arrival = state.arrival + [current_time]
+        state.remaining = state.remaining + [service]
+        state.job_type = state.job_type + [job_type]
+        state.completion = self.get_next_completion(current_time)
+
+    def process_completion(self, key):
+        state = self.state
+        current_time = key[0]
+        self.process_time(current_time)
+
+        i = state.remaining.index(min(state.remaining))
+        arrival = state.arrival[i]
+        job_type = state.job_type[i]
+        state.arrival = state.arrival[:i] + state.arrival[i + 1:]
+        state.remaining = state.remaining[:i] + state.remaining[i + 1:]
+        state.job_type = state.job_type[:i] + state.job_type[i + 1:]
+        state.index += 1
+
+        d = current_time - arrival - state.avg_service
+        state.avg_service += d / state.index
+
+        if self.lp == LP_A:
+            c = job_type.value - JobType.A1.value
+            class_index = list(state.class_index)
+            class_avg_service = list(state.class_avg_service)
+            class_index[c] += 1
+            d = current_time - arrival - class_avg_service[c]
+            class_avg_service[c] += d / class_index[c]
+            state.class_index = tuple(class_index)
+            state.class_avg_service = tuple(class_avg_service)
+
+        if job_type in ROUTES:
+            destination, next_job_type = ROUTES[job_type]
+            self.send(key, destination, current_time, next_job_type)
+        state.completion = self.get_next_completion(current_time)
+
+    def send(self, key, destination, time, job_type, sign=1, message_id=None):
+        if message_id is None:
+            self.counter += 1
+            message_id = self.counter * len(self.inboxes) + self.lp
+            self.sent.append((key, destination, message_id, time, job_type.value))
+        self.outbox[destination].append((sign, message_id, time, job_type.value))
+
+    def flush(self):
+        for destination, messages in enumerate(self.outbox):
+            if messages:
+                self.inboxes[destination].put(('messages', messages))
+                self.sent_count += len(messages)
+                self.outbox[destination] = []
+
+    def get_next_event(self):
+        # (key, job type) of the next transfer, or (key, None) of the next internal event
+        while self.pending and self.pending[0][2] in self.annihilated:
+            self.annihilated.discard(heapq.heappop(self.pending)[2])
+        message = self.pending[0] if self.pending else (INFINITY, 0, 0, 0)
+        internal = (self.state.completion, COMPLETION, -1)
+        if self.lp == LP_A:
+            internal = min(internal, (self.state.arrival_a, ARRIVAL, -1))
+        if message[:3] < internal:
+            return message[:3], message[3]
+        return internal, None
+
+    def execute(self, key, job_type):
+        state = self.state
+        if job_type is not None:
+            heapq.heappop(self.pending)
+            self.processed.append(key + (job_type,))
+            self.processed_ids.add(key[2])
+            self.process_arrival(key[0], JobType(job_type))
+        elif key[1] == ARRIVAL:
+            self.process_arrival(key[0], JobType.A1)
+            select_stream(0)
+            state.arrival_temp += exponential(1.0 / self.arrival_rate)
+            state.arrival_a = state.arrival_temp
+            if state.arrival_a > self.stop:
+                state.arrival_a = INFINITY
+        else:
+            self.process_completion(key)
+
+        state.lvt = key
+        self.save_seeds()
+        self.states.append(copy.copy(state))
+        self.executed += 1
+
+    def rollback(self, key):
+        # restores the last checkpoint before key, returns the transfers executed since then to the pending
+        # heap and cancels the transfers sent since then
+        while self.states[-1].lvt >= key:
+            self.states.pop()
+            self.rolled_back += 1
+        self.state = copy.copy(self.states[-1])
+        self.restore_seeds()
+        while self.processed and self.processed[-1][:3] >= key:
+            message = self.processed.pop()
+            self.processed_ids.discard(message[2])
+            heapq.heappush(self.pending, message)
+        while self.sent and self.sent[-1][0] >= key:
+            _, destination, message_id, time, job_type = self.sent.pop()
+            self.send(key, destination, time, JobType(job_type), -1, message_id)
+        self.rollbacks += 1
+
+    def receive_messages(self, messages):
+        for sign, message_id, time, job_type in messages:
+            self.received_count += 1
+            key = (time, MESSAGE[self.lp], message_id)
+            if sign > 0:
+                if key < self.state.lvt:
+                    self.rollback(key)  # straggler
+                heapq.heappush(self.pending, key + (job_type,))
+            else:
+                if message_id in self.processed_ids:
+                    self.rollback(key)
+                self.annihilated.add(message_id)
+
+    def fossil_collect(self, gvt):
+        # nothing earlier than GVT can be rolled back any more
+        i = 0
+        while i + 1 < len(self.states) and self.states[i + 1].lvt[0] < gvt:
+            i += 1
+        del self.states[:i]
+        i = 0
+        while i < len(self.processed) and self.processed[i][0] < gvt:
+            self.processed_ids.discard(self.processed[i][2])
+            i += 1
+        del self.processed[:i]
+        i = 0
+        while i < len(self.sent) and self.sent[i][0][0] < gvt:
+            i += 1
+        del self.sent[:i]
+
+    def handle(self, item):
+        if item[0] == 'messages':
+            self.receive_messages(item[1])
+        elif item[0] == 'report':
+            self.flush()
+            self.paused = True
+            self.reports.put(('report', self.lp, item[1], self.sent_count, self.received_count,
+                              self.get_next_event()[0][0]))
+        elif item[0] == 'gvt':
+            self.gvt = item[1]
+            self.fossil_collect(self.gvt)
+            self.paused = False
+        elif item[0] == 'stop':
+            state = self.state
+            self.reports.put(('stats', self.lp, {
+                'last_event': state.lvt[0], 'avg_interarrival': state.avg_interarrival,
+                'avg_service': state.avg_service, 'area_node': state.area_node, 'area_service': state.area_service,
+                'index': state.index, 'class_avg_service': state.class_avg_service,
+                'executed': self.executed, 'rolled_back': self.rolled_back, 'rollbacks': self.rollbacks}))
+            self.done = True
+
+    def receive(self, block):
+        if block:
+            self.handle(self.inbox.get())
+        while not self.done:
+            try:
+                self.handle(self.inbox.get_nowait())
+            except queue.Empty:
+                return
+
+    def has_event(self):
+        time = self.get_next_event()[0][0]
+        return time < INFINITY and time <= self.gvt + self.window
+
+    def run(self):
+        while not self.done:
+            self.receive(self.paused or not self.has_event())
+            if not self.paused:
+                for _ in range(CHUNK):
+                    if not self.has_event():
+                        break
+                    self.execute(*self.get_next_event())
+            self.flush()
+
+
+def run_logical_process(lp, arrival_rate, auth, b_improvement, stop, seed, window, inboxes, reports):
+    plant_seeds(seed)
+    LogicalProcess(lp, arrival_rate, auth, b_improvement, stop, window, inboxes, reports).run()
+
+
+def get_gvt(inboxes, reports, gvt_round):
+    # coordinator round: pauses every LP and collects its cumulative send and receive counts and its
+    # earliest pending event; LPs keep receiving (and rolling back) while paused
+    for inbox in inboxes:
+        inbox.put(('report', gvt_round))
+    counts = {}
+    local_min = INFINITY
+    while len(counts) < len(inboxes):
+        _, lp, report_round, sent, received, time = reports.get()
+        if report_round == gvt_round:
+            counts[lp] = (sent, received)
+            local_min = min(local_min, time)
+    return counts, local_min
+
+
+def model(arrival_rate, auth, b_improvement=False, stop=STOP, seed=123456789, window=WINDOW):
+    # finite horizon run of WebAppDES.model with the nodes A, B and P as Time Warp logical processes;
+    # returns the same 17 metrics and the Time Warp counters
+    inboxes = [multiprocessing.Queue() for _ in LP_NAMES]
+    reports = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_logical_process,
+                                       args=(lp, arrival_rate, auth, b_improvement, stop, seed, window, inboxes,
+                                             reports))
+               for lp in range(len(LP_NAMES))]
+    for worker in workers:
+        worker.start()
+
+    gvt = START
+    gvt_round = 0
+    gvt_rounds = 0
+    previous = None
+    while gvt < INFINITY:
+        gvt_round += 1
+        counts, local_min = get_gvt(inboxes, reports, gvt_round)
+        sent = sum(count[0] for count in counts.values())
+        received = sum(count[1] for count in counts.values())
+        # two identical rounds with nothing in transit: every LP was idle in between, so local_min is the GVT
+        if counts == previous and sent == received:
+            gvt = local_min
+            gvt_rounds += 1
+            previous = None
+            for inbox in inboxes:
+                inbox.put(('gvt', gvt) if gvt < INFINITY else ('stop',))
+            sleep(GVT_INTERVAL)
+        else:
+            previous = counts
+
+    stats = {}
+    while len(stats) < len(workers):
+        item = reports.get()
+        if item[0] == 'stats':
+            stats[item[1]] = item[2]
+    for worker in workers:
+        worker.join()
+
+    current_time = max(s['last_event'] for s in stats.values())
+    elapsed = current_time - START
+    data = []
+    for lp in range(len(LP_NAMES)):
+        s = stats[lp]
+        data += [s['avg_interarrival'], s['avg_service'], s['area_node'] / elapsed, s['area_service'] / elapsed,
+                 s['index']]
+    class_avg_service = stats[LP_A]['class_avg_service']
+    data += [class_avg_service[0] + class_avg_service[1] + class_avg_service[2] + stats[LP_B]['avg_service'] +
+             stats[LP_P]['avg_service'],
+             stats[LP_A]['area_node'] / elapsed + stats[LP_B]['area_node'] / elapsed +
+             stats[LP_P]['area_node'] / elapsed]
+
+    counters = {'executed': sum(s['executed'] for s in stats.values()),
+                'rolled_back': sum(s['rolled_back'] for s in stats.values()),
+                'rollbacks': sum(s['rollbacks'] for s in stats.values()),
+                'gvt_rounds': gvt_rounds}
+    return data, counters
+
+
+def benchmark(stop=3000.0):
+    start = datetime.now()
+    seed = 123456789
+    print(f"Start Time Warp Benchmark on {multiprocessing.cpu_count()} cpus")
+    with open('data_timewarp_benchmark.csv', 'w', newline='') as csvfile:
+        fieldnames = ['auth', 'arrival_rate', 'stop', 'window', 'sequential_time', 'timewarp_time', 'speedup',
+                      'identical', 'executed', 'rolled_back', 'efficiency', 'rollbacks', 'gvt_rounds']
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        sequential_stop = WebAppDES.STOP
+        WebAppDES.STOP = stop
+        for auth, arrival_rate in [(1, 0.5), (1, 0.9), (2, 1.2)]:
+            plant_seeds(seed)
+            begin = perf_counter()
+            expected = WebAppDES.model(arrival_rate, auth)
+            sequential_time = perf_counter() - begin
+
+            for window in [2.0, WINDOW, 50.0]:
+                begin = perf_counter()
+                data, counters = model(arrival_rate, auth, stop=stop, seed=seed, window=window)
+                timewarp_time = perf_counter() - begin
+
+                # committed events over executed events
+                efficiency = 1 - counters['rolled_back'] / counters['executed']
+                writer.writerow([auth, arrival_rate, stop, window, sequential_time, timewarp_time,
+                                 sequential_time / timewarp_time, data == expected, counters['executed'],
+                                 counters['rolled_back'], efficiency, counters['rollbacks'], counters['gvt_rounds']])
+                print(f"Time Warp: arrival_rate {arrival_rate}, auth type {auth}, window {window}: "
+                      f"sequential {sequential_time:.2f}s, time warp {timewarp_time:.2f}s, "
+                      f"efficiency {efficiency:.2f}, identical {data == expected}")
+        WebAppDES.STOP = sequential_stop
+
+    end = datetime.now()
+    print(f"Time Warp Benchmark time: {end - start}\n")
+
+
+def main():
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
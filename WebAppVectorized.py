@@ -0,0 +1,241 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+
+from rngs import MODULUS, MULTIPLIER, STREAMS, plant_seeds, select_stream, get_seed, random
+from WebAppDES import JobType, get_avg_demand
+
+START = 0.0  # initial time
+STOP = 28800.0  # terminal time
+INFINITY = np.inf
+CAPACITY = 64  # initial job slots per node and replica, doubled when a replica fills them
+
+# node event columns, in the same priority order as the if/elif chain of WebAppDES.model
+ARRIVAL = 0
+COMPLETION_A = 1
+COMPLETION_B = 2
+COMPLETION_P = 3
+
+
+class Streams:
+    # the Lehmer generator of rngs advanced for many replications at once, one state per replication and stream
+    def __init__(self, seeds):
+        self.state = [np.zeros(len(seeds), dtype=np.int64) for _ in range(6)]
+        for r, seed in enumerate(seeds):
+            plant_seeds(seed)
+            for s in range(6):
+                select_stream(s)
+                self.state[s][r] = get_seed()
+
+    def exponential(self, replicas, stream, m):
+        state = self.state[stream]
+        x = state[replicas] * MULTIPLIER % MODULUS
+        state[replicas] = x
+        return -m * np.log(1.0 - x / MODULUS)
+
+
+class Node:
+    # a PS node for every replication. Jobs are kept as finish tags on the node's virtual (attained service)
+    # clock, which advances by interval / number, so an event costs O(replications) instead of touching
+    # every job. One row of slots per replication, empty slots hold INFINITY.
+    def __init__(self, replications):
+        self.tag = np.full((replications, CAPACITY), INFINITY)
+        self.arrival = np.zeros((replications, CAPACITY))
+        self.job_type = np.zeros((replications, CAPACITY), dtype=np.int64)
+        self.number = np.zeros(replications, dtype=np.int64)
+        self.virtual = np.zeros(replications)
+        self.min_tag = np.full(replications, INFINITY)
+
+        self.area = np.zeros(replications)  # time integrated number in the node
+        self.service = np.zeros(replications)  # time integrated number in service
+        self.arrivals = np.zeros(replications, dtype=np.int64)
+        self.last_arrival = np.zeros(replications)
+        self.index = np.zeros(replications, dtype=np.int64)
+        self.total_service = np.zeros(replications)
+
+    def get_next_completion(self, current):
+        busy = self.number > 0
+        return np.where(busy, current + (self.min_tag - self.virtual) * np.where(busy, self.number, 1), INFINITY)
+
+    def advance(self, interval):
+        busy = self.number > 0
+        self.area += interval * self.number
+        self.service += interval * busy
+        self.virtual += interval / np.maximum(self.number, 1)
+
+    def process_arrival(self, replicas, current, job_type, service):
+        if len(replicas) == 0:
+            return
+        if self.number[replicas].max() == self.tag.shape[1]:
+            self.grow()
+        slot = np.argmax(self.tag[replicas] == INFINITY, axis=1)
+        tag = self.virtual[replicas] + service
+        self.tag[replicas, slot] = tag
+        self.min_tag[replicas] = np.minimum(self.min_tag[replicas], tag)
+        self.arrival[replicas, slot] = current[replicas]
+        self.job_type[replicas, slot] = job_type
+        self.number[replicas] += 1
+        self.arrivals[replicas] += 1
+        self.last_arrival[replicas] = current[replicas]
+
+    def process_completion(self, replicas, current):
+        tags = self.tag[replicas]
+        slot = np.argmin(tags, axis=1)
+        tags[np.arange(len(replicas)), slot] = INFINITY
+        self.tag[replicas, slot] = INFINITY
+        self.min_tag[replicas] = tags.min(axis=1)
+        response = current[replicas] - self.arrival[replicas, slot]
+        job_type = self.job_type[replicas, slot]
+        self.number[replicas] -= 1
+        self.index[replicas] += 1
+        self.total_service[replicas] += response
+        return job_type, response
+
+    def grow(self):
+        replications, capacity = self.tag.shape
+        self.tag = np.hstack((self.tag, np.full((replications, capacity), INFINITY)))
+        self.arrival = np.hstack((self.arrival, np.zeros((replications, capacity))))
+        self.job_type = np.hstack((self.job_type, np.zeros((replications, capacity), dtype=np.int64)))
+
+    def get_statistics(self, elapsed):
+        index = np.maximum(self.index, 1)
+        arrivals = np.maximum(self.arrivals, 1)
+        # the mean of the interarrival times measured from time zero telescopes to the last arrival
+        return [self.last_arrival / arrivals, self.total_service / index, self.area / elapsed,
+                self.service / elapsed, self.index]
+
+
+def model(arrival_rates, seeds, auth, b_improvement=False):
+    # one finite horizon run of WebAppDES.model for every (arrival_rate, seed) pair, advanced in lockstep;
+    # auth may also be given per replication
+    arrival_rates = np.asarray(arrival_rates, dtype=float)
+    replications = len(arrival_rates)
+    auth = np.broadcast_to(auth, replications)
+    demands = {job_type: np.array([get_avg_demand(job_type, a, b_improvement) for a in auth])
+               for job_type in JobType}
+
+    streams = Streams(seeds)
+    server_a = Node(replications)
+    server_b = Node(replications)
+    server_p = Node(replications)
+    # per class response times at A, as kept by the JobStats of WebAppDES
+    class_index = np.zeros((replications, 4), dtype=np.int64)
+    class_service = np.zeros((replications, 4))
+
+    current = np.full(replications, START)
+    arrival = START + streams.exponential(np.arange(replications), 0, 1.0 / arrival_rates)
+    arrival[arrival > STOP] = INFINITY
+    events = np.empty((replications, 4))
+
+    while True:
+        events[:, ARRIVAL] = arrival
+        events[:, COMPLETION_A] = server_a.get_next_completion(current)
+        events[:, COMPLETION_B] = server_b.get_next_completion(current)
+        events[:, COMPLETION_P] = server_p.get_next_completion(current)
+        event = np.argmin(events, axis=1)
+        next_time = events.min(axis=1)
+        active = next_time < INFINITY
+        if not active.any():
+            break
+        event[~active] = -1
+
+        interval = np.where(active, next_time - current, 0.0)
+        server_a.advance(interval)
+        server_b.advance(interval)
+        server_p.advance(interval)
+        current = np.where(active, next_time, current)
+
+        # arrival_a1
+        r = np.flatnonzero(event == ARRIVAL)
+        if len(r) > 0:
+            server_a.process_arrival(r, current, JobType.A1.value,
+                                     streams.exponential(r, 1, demands[JobType.A1][r]))
+            arrival[r] = current[r] + streams.exponential(r, 0, 1.0 / arrival_rates[r])
+            arrival[r[arrival[r] > STOP]] = INFINITY
+
+        # completion_a
+        r = np.flatnonzero(event == COMPLETION_A)
+        if len(r) > 0:
+            job_type, response = server_a.process_completion(r, current)
+            class_index[r, job_type] += 1
+            class_service[r, job_type] += response
+            to_b = r[job_type == JobType.A1.value]
+            server_b.process_arrival(to_b, current, JobType.B.value,
+                                     streams.exponential(to_b, 4, demands[JobType.B][to_b]))
+            to_p = r[job_type == JobType.A2.value]
+            server_p.process_arrival(to_p, current, JobType.P.value,
+                                     streams.exponential(to_p, 5, demands[JobType.P][to_p]))
+
+        # completion_b
+        r = np.flatnonzero(event == COMPLETION_B)
+        if len(r) > 0:
+            server_b.process_completion(r, current)
+            server_a.process_arrival(r, current, JobType.A2.value,
+                                     streams.exponential(r, 2, demands[JobType.A2][r]))
+
+        # completion_p
+        r = np.flatnonzero(event == COMPLETION_P)
+        if len(r) > 0:
+            server_p.process_completion(r, current)
+            server_a.process_arrival(r, current, JobType.A3.value,
+                                     streams.exponential(r, 3, demands[JobType.A3][r]))
+
+    elapsed = current - START
+    avg_response_time = (class_service[:, 1:] / np.maximum(class_index[:, 1:], 1)).sum(axis=1) + (
+            server_b.total_service / np.maximum(server_b.index, 1) +
+            server_p.total_service / np.maximum(server_p.index, 1))
+    avg_population = (server_a.area + server_b.area + server_p.area) / elapsed
+
+    columns = (server_a.get_statistics(elapsed) + server_b.get_statistics(elapsed) +
+               server_p.get_statistics(elapsed) + [avg_response_time, avg_population])
+    return [[float(column[r]) for column in columns] for r in range(replications)]
+
+
+def get_replication_seeds(seed, replications):
+    # independent replication seeds drawn over the whole period from the last stream of a planted seed
+    plant_seeds(seed)
+    select_stream(STREAMS - 1)
+    return [int(random() * (MODULUS - 1)) + 1 for _ in range(replications)]
+
+
+def finite_horizon_simulation():
+    start = datetime.now()
+    seed = 123456789
+    print("Start Vectorized Finite Horizon Simulation")
+    with open('data_obj_1_2_vectorized_finite_horizon.csv', 'w', newline='') as csvfile:
+        fieldnames = ['seed', 'auth', 'arrival_rate',
+                      'interarrival_a', 'avg_service_a', 'avg_population_a', 'utilization_a', 'completion_a',
+                      'interarrival_b', 'avg_service_b', 'avg_population_b', 'utilization_b', 'completion_b',
+                      'interarrival_p', 'avg_service_p', 'avg_population_p', 'utilization_p', 'completion_p',
+                      'avg_response_time', 'avg_population']
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+
+        auth_types = [1, 2]
+        arrival_rates = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+        replication_seeds = get_replication_seeds(seed, 8)
+        # every seed, auth type and arrival rate advances in the same interpreter steps
+        points = [(s, auth, arrival_rate) for s in replication_seeds for auth in auth_types
+                  for arrival_rate in arrival_rates]
+        print(f"Vectorized Finite Horizon: {len(points)} replications")
+        results = model([point[2] for point in points], [point[0] for point in points],
+                        [point[1] for point in points])
+        for point, data in zip(points, results):
+            writer.writerow(list(point) + data)
+
+    end = datetime.now()
+    print(f"Vectorized Finite Horizon Simulation time: {end - start}\n")
+
+
+def main():
+    start = datetime.now()
+
+    finite_horizon_simulation()
+
+    end = datetime.now()
+    print(f"Total Simulation time: {end - start}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -80,12 +80,11 @@ class Server:
         self.index = 0
         self.area.node = 0
         self.area.service = 0
-        self.last_event = current_time
 
         self.avg_interarrival = 0
         self.arrivals = 0
         self.interarrival_variance = 0
-        self.last_arrival = 0
+        self.last_arrival = current_time
 
         self.avg_service = 0
         self.service_variance = 0
@@ -131,6 +130,7 @@ def model(arrival_rate, b=0, k=0):
     global arrivalTemp
     arrivalTemp = START
     batch_enabled = b != 0 and k != 0
+    stop = INFINITY if batch_enabled else STOP  # batches run on a continuous clock until k are collected
 
     server_a = Server()
     t = Time()
@@ -140,8 +140,9 @@ def model(arrival_rate, b=0, k=0):
 
     arrivals_a = 0  # batch measure index
     means = []
+    batch_start = START  # epoch of the current batch
 
-    while t.arrival_a < STOP or server_a.number > 0:
+    while t.arrival_a < stop or server_a.number > 0:
 
         t.next = min(t.arrival_a, t.completion_a)  # next event time
 
@@ -156,7 +157,7 @@ def model(arrival_rate, b=0, k=0):
             server_a.process_arrival(Job(t.arrival_a))
 
             t.arrival_a = get_arrival(arrival_rate)
-            if t.arrival_a > STOP:
+            if t.arrival_a > stop:
                 t.last = t.current
                 t.arrival_a = INFINITY
             t.completion_a = t.current + server_a.get_next_complete_process_time()
@@ -174,21 +175,14 @@ def model(arrival_rate, b=0, k=0):
 
         if batch_enabled and arrivals_a == b:
             means.append(
-                [server_a.avg_interarrival, server_a.avg_service, server_a.area.node / t.current,
-                 server_a.area.service / t.current, server_a.index])
+                [server_a.avg_interarrival, server_a.avg_service, server_a.area.node / (t.current - batch_start),
+                 server_a.area.service / (t.current - batch_start), server_a.index])
 
             arrivals_a = 0
-            t.completion_a -= t.current
-
-            t.arrival_a -= t.current
-            t.current = START
-            arrivalTemp = START
+            batch_start = t.current
 
             server_a.reset_stats(t.current)
 
-            for j in server_a.jobs:
-                j.arrival = t.current
-
             if len(means) == k:
                 data = []
                 for i in range(5):